@@ -1,3 +1,11 @@
-from .database import Base, Chapter, Section, Paragraph, Translation, init_db
+from .database import (
+    Base, Chapter, Section, Paragraph, Translation, TranslationCache,
+    SemanticCacheEntry, init_db, init_db_rw, insert_or_ignore, upsert,
+    query_in_chunks
+)
 
-__all__ = ['Base', 'Chapter', 'Section', 'Paragraph', 'Translation', 'init_db']
+__all__ = [
+    'Base', 'Chapter', 'Section', 'Paragraph', 'Translation', 'TranslationCache',
+    'SemanticCacheEntry', 'init_db', 'init_db_rw', 'insert_or_ignore', 'upsert',
+    'query_in_chunks'
+]
@@ -7,28 +7,156 @@ This script creates complete book documents with all chapters and sections:
 """
 
 import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import attrgetter
 from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+from lxml import etree
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import Session
 
-from src.models import init_db, Chapter, Section
+from src.models import init_db_rw, Chapter, Section
 from src.utils import config
-from src.pipeline.step3_export import DocumentExporter
+from src.pipeline.step3_export import DocumentExporter, ExportRow, render_chapter_xml
+
+
+# One row per paragraph, with its chapter, section and translation for one prompt.
+# Sections without paragraphs, and chapters without sections or paragraphs, still
+# get a row (with NULL paragraph/section columns) so their headings are exported.
+CREATE_EXPORT_ROWS = """
+CREATE TEMP TABLE export_rows AS
+SELECT
+    c.chapter_number AS chapter_number,
+    c.title AS chapter_title,
+    s.section_number AS section_number,
+    s.title AS section_title,
+    p.paragraph_number AS paragraph_number,
+    p.text AS original,
+    t.translated_text AS translation
+FROM chapters c
+LEFT JOIN sections s ON s.chapter_id = c.id
+LEFT JOIN paragraphs p ON p.chapter_id = c.id AND (
+    p.section_id = s.id OR (s.id IS NULL AND p.section_id IS NULL)
+)
+LEFT JOIN translations t ON t.paragraph_id = p.id AND t.prompt_name = :prompt_name
+"""
+
+SELECT_EXPORT_ROWS = """
+SELECT * FROM export_rows
+ORDER BY chapter_number, section_number, paragraph_number
+"""
+
+COUNT_EXPORT_CHAPTERS = "SELECT COUNT(DISTINCT chapter_number) FROM export_rows"
+
+# Rows fetched from export_rows at a time
+EXPORT_ROWS_BATCH = 500
+
+
+def create_export_rows(session: Session, prompt_name: str):
+    """
+    Materialize the book's paragraphs and translations for a prompt into the
+    temporary export_rows table.
+    
+    The table belongs to the session's connection, so create it once and export
+    any number of versions from it with export_complete_book, then call
+    drop_export_rows before closing the session.
+    
+    Args:
+        session: Database session
+        prompt_name: Translation prompt name to export
+    """
+    session.execute(text("DROP TABLE IF EXISTS export_rows"))
+    session.execute(text(CREATE_EXPORT_ROWS), {'prompt_name': prompt_name})
+
+
+def drop_export_rows(session: Session):
+    """Drop the export_rows table (pooled connections would otherwise keep it)."""
+    session.execute(text("DROP TABLE IF EXISTS export_rows"))
+
+
+def iter_export_chapters(session: Session) -> Iterator[Tuple[str, List[ExportRow]]]:
+    """
+    Read export_rows in book order, one chapter at a time.
+    
+    Rows are fetched in batches as the chapters are consumed, so only the
+    chapters being worked on are held in memory, however long the book is.
+    The session must not run other statements until the iteration is done.
+    
+    Yields:
+        (chapter title, the chapter's rows) tuples
+    """
+    rows = session.execute(
+        text(SELECT_EXPORT_ROWS),
+        execution_options={'yield_per': EXPORT_ROWS_BATCH}
+    )
+    for _, chapter_rows in groupby(rows, key=attrgetter('chapter_number')):
+        chapter_rows = [ExportRow(**row._mapping) for row in chapter_rows]
+        yield chapter_rows[0].chapter_title, chapter_rows
+
+
+def render_chapters(
+    chapters: Iterable[Tuple[str, List[ExportRow]]],
+    prompt_name: str,
+    show_original: bool,
+    executor: Optional[ProcessPoolExecutor] = None,
+    window: int = 1
+) -> Iterator[Tuple[str, bytes]]:
+    """
+    Render chapters with render_chapter_xml, in book order.
+    
+    With an executor, up to window chapters are submitted ahead of the one
+    being returned. Executor.map would submit (and so read and pickle) every
+    chapter up front.
+    
+    Args:
+        chapters: (chapter title, rows) tuples, as from iter_export_chapters
+        prompt_name: Translation prompt name to export
+        show_original: Whether to show original text alongside translation
+        executor: Process pool to render in, or None to render in this process
+        window: Maximum number of chapters submitted to the executor at once
+    
+    Yields:
+        (chapter title, the chapter's body XML) tuples
+    """
+    if executor is None:
+        for title, rows in chapters:
+            yield title, render_chapter_xml(title, rows, prompt_name, show_original)
+        return
+    
+    pending = deque()
+    for title, rows in chapters:
+        pending.append((title, executor.submit(render_chapter_xml, title, rows, prompt_name, show_original)))
+        if len(pending) >= window:
+            title, future = pending.popleft()
+            yield title, future.result()
+    while pending:
+        title, future = pending.popleft()
+        yield title, future.result()
 
 
 def export_complete_book(
     session: Session,
     prompt_name: str,
     show_original: bool,
-    output_file: Path
+    output_file: Path,
+    workers: Optional[int] = None
 ):
     """
     Export the complete book with all chapters and sections.
     
+    Reads the export_rows table, which must already have been created for
+    prompt_name with create_export_rows.
+    
     Args:
         session: Database session
         prompt_name: Translation prompt name to export
         show_original: Whether to show original text alongside translation
         output_file: Path to save the document
+        workers: Number of processes rendering chapters in parallel
+                 (default: one per CPU; 1 renders in this process)
     """
     print(f"\nCreating book document...")
     print(f"  Prompt: {prompt_name}")
@@ -39,48 +167,53 @@ def export_complete_book(
     exporter = DocumentExporter(show_original=show_original, prompt_name=prompt_name)
     
     # Add title page
-    title = exporter.doc.add_heading(level=0)
-    title_run = title.add_run("חובות הלבבות")
-    title_run.font.name = 'David'
-    title_run.font.size = 24
-    exporter._set_paragraph_rtl(title)
+    title_run = exporter._make_run("חובות הלבבות", size=24)
+    exporter._append_element(exporter._make_rtl_para(title_run, style='Title'))
     
-    subtitle = exporter.doc.add_paragraph()
     if show_original:
-        subtitle_run = subtitle.add_run(exporter._fix_rtl_text("תרגום לעברית מודרנית (עם מקור)"))
+        subtitle_text = exporter._fix_rtl_text("תרגום לעברית מודרנית (עם מקור)")
     else:
-        subtitle_run = subtitle.add_run(exporter._fix_rtl_text("תרגום לעברית מודרנית"))
-    subtitle_run.font.name = 'David'
-    subtitle_run.font.size = 16
-    subtitle_run.italic = True
-    exporter._set_paragraph_rtl(subtitle)
-    
-    author = exporter.doc.add_paragraph()
-    author_run = author.add_run("רבנו בחיי אבן פקודה")
-    author_run.font.name = 'David'
-    author_run.font.size = 14
-    exporter._set_paragraph_rtl(author)
+        subtitle_text = exporter._fix_rtl_text("תרגום לעברית מודרנית")
+    subtitle_run = exporter._make_run(subtitle_text, size=16, italic=True)
+    exporter._append_element(exporter._make_rtl_para(subtitle_run))
     
-    exporter.doc.add_page_break()
+    author_run = exporter._make_run("רבנו בחיי אבן פקודה", size=14)
+    exporter._append_element(exporter._make_rtl_para(author_run))
     
-    # Get all chapters
-    chapters = session.query(Chapter).order_by(Chapter.chapter_number).all()
+    exporter._append_element(exporter._make_page_break())
     
-    total_chapters = len(chapters)
+    # A single ordered scan of export_rows, read as the chapters are rendered
+    total_chapters = session.execute(text(COUNT_EXPORT_CHAPTERS)).scalar()
+    chapters = iter_export_chapters(session)
     print(f"\n  Processing {total_chapters} chapters...")
     
-    for idx, chapter in enumerate(chapters, 1):
-        print(f"  [{idx}/{total_chapters}] {chapter.title}...")
-        
-        # Export the chapter
-        exporter.export_chapter(session, chapter)
-        
-        # Add page break after each chapter (except the last)
-        if idx < total_chapters:
-            exporter.doc.add_page_break()
+    # Each chapter is rendered on its own and sent back as body XML, which is
+    # written to the file as it arrives (see save_streamed), so only the chapters
+    # in flight are held in memory
+    workers = min(workers or os.cpu_count() or 1, total_chapters)
+    executor = None
+    if workers > 1:
+        # Render the chapters in worker processes, keeping each of them busy
+        executor = ProcessPoolExecutor(max_workers=workers)
+    rendered = render_chapters(chapters, prompt_name, show_original, executor, window=2 * workers)
+    page_break = etree.tostring(exporter._make_page_break())
+    
+    def book_fragments():
+        for idx, (chapter_title, chapter_xml) in enumerate(rendered, 1):
+            print(f"  [{idx}/{total_chapters}] {chapter_title}...")
+            yield chapter_xml
+            
+            # Add page break after each chapter (except the last)
+            if idx < total_chapters:
+                yield page_break
+    
+    try:
+        # Save the document
+        exporter.save_streamed(output_file, book_fragments())
+    finally:
+        if executor is not None:
+            executor.shutdown()
     
-    # Save the document
-    exporter.save(output_file)
     print(f"\n✓ Book export complete!")
 
 
@@ -114,6 +247,11 @@ def main():
         action='store_true',
         help='Only create version with translation only'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Number of processes rendering chapters in parallel (default: one per CPU, 1 to disable)'
+    )
     
     args = parser.parse_args()
     
@@ -139,12 +277,13 @@ def main():
     print(f"Output directory: {output_dir}")
     
     # Initialize database
-    engine, SessionLocal = init_db(config.database_url)
-    session = SessionLocal()
+    # The export only reads, so use the reader pool
+    write_engine, WriteSession, ReadSession = init_db_rw(config.database_url)
+    session = ReadSession()
     
     try:
         # Count total chapters for info
-        total_chapters = session.query(Chapter).count()
+        total_chapters = session.execute(select(func.count()).select_from(Chapter)).scalar()
         print(f"Total chapters: {total_chapters}")
         
         # Determine which versions to create
@@ -160,6 +299,9 @@ def main():
         print(f"Creating versions: {', '.join(versions_to_create)}")
         print("=" * 80)
         
+        # Join the book's tables once; both versions are rendered from the result
+        create_export_rows(session, args.prompt)
+        
         # Create version with original text
         if create_with_original:
             print("\n" + "=" * 80)
@@ -170,7 +312,8 @@ def main():
                 session=session,
                 prompt_name=args.prompt,
                 show_original=True,
-                output_file=output_file
+                output_file=output_file,
+                workers=args.workers
             )
         
         # Create version with translation only
@@ -183,7 +326,8 @@ def main():
                 session=session,
                 prompt_name=args.prompt,
                 show_original=False,
-                output_file=output_file
+                output_file=output_file,
+                workers=args.workers
             )
         
         # Final summary
@@ -201,6 +345,7 @@ def main():
         print("\n✓ All exports complete! Open the files in Word to review.")
     
     finally:
+        drop_export_rows(session)
         session.close()
 
 
@@ -0,0 +1,143 @@
+"""
+Semantic cache for translations of near-identical paragraphs.
+
+The book repeats many formulae and phrases with only slight variations, which
+the exact-match response cache (translation_cache) misses. This cache keeps an
+embedding of every translated paragraph and reuses a translation when a new
+paragraph's embedding is close enough (cosine similarity above a threshold).
+
+To avoid reusing a translation for a paragraph that differs in a meaningful
+word (a name, a number, a cited verse), a match is also rejected when more
+than a few words differ between the two texts, ignoring vowel points.
+
+Vectors are compared by brute force; a single book is a few thousand
+paragraphs, so no vector index is needed.
+"""
+
+import hashlib
+import re
+import unicodedata
+from array import array
+from math import sqrt
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from src.models import SemanticCacheEntry
+
+# Matches a word (sequence of letters/digits, including Hebrew) once points are removed
+_WORD_RE = re.compile(r'\w+')
+
+
+def _normalize(vector: List[float]) -> array:
+    """Scale a vector to unit length so cosine similarity is a dot product."""
+    norm = sqrt(sum(x * x for x in vector)) or 1.0
+    return array('f', (x / norm for x in vector))
+
+
+def _words(text: str) -> set:
+    """The set of words in text, with niqqud and cantillation marks removed."""
+    stripped = ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+    return set(_WORD_RE.findall(stripped))
+
+
+class SemanticCache:
+    """Nearest-neighbour lookup of earlier translations by paragraph embedding."""
+    
+    def __init__(
+        self,
+        session: Session,
+        scope: str,
+        threshold: float = 0.95,
+        max_word_diff: int = 2
+    ):
+        """
+        Initialize the cache.
+        
+        Args:
+            session: Database session (new entries join its current transaction)
+            scope: Identifies the prompt and model; only entries with the same
+                   scope are matched
+            threshold: Minimum cosine similarity for a match
+            max_word_diff: Maximum number of words that may appear in only one of
+                           the two texts for a match to be accepted
+        """
+        self.session = session
+        self.scope = hashlib.sha256(scope.encode('utf-8')).hexdigest()
+        self.threshold = threshold
+        self.max_word_diff = max_word_diff
+        
+        # Loaded on first lookup: (unit vector, text, translated_text)
+        self._entries = None
+    
+    def _load(self):
+        """Load this scope's entries from the database."""
+        rows = self.session.query(
+            SemanticCacheEntry.embedding,
+            SemanticCacheEntry.text,
+            SemanticCacheEntry.translated_text
+        ).filter(SemanticCacheEntry.scope == self.scope).all()
+        
+        self._entries = []
+        for embedding, text, translated_text in rows:
+            vector = array('f')
+            vector.frombytes(embedding)
+            self._entries.append((vector, text, translated_text))
+    
+    def lookup(self, text: str, embedding: List[float]) -> Optional[str]:
+        """
+        Find the translation of the most similar earlier paragraph.
+        
+        Args:
+            text: Paragraph text
+            embedding: The paragraph's embedding
+        
+        Returns:
+            The cached translation, or None if there is no close enough match
+        """
+        if self._entries is None:
+            self._load()
+        if not self._entries:
+            return None
+        
+        vector = _normalize(embedding)
+        best_score, best_entry = -1.0, None
+        for entry in self._entries:
+            score = sum(a * b for a, b in zip(vector, entry[0]))
+            if score > best_score:
+                best_score, best_entry = score, entry
+        
+        if best_score < self.threshold:
+            return None
+        
+        # Lexical guard: near-identical vectors can still differ in a word that matters
+        if len(_words(text) ^ _words(best_entry[1])) > self.max_word_diff:
+            return None
+        
+        return best_entry[2]
+    
+    def add(self, texts: List[str], embeddings: List[List[float]], translations: List[str]):
+        """
+        Add translated paragraphs to the cache.
+        
+        Args:
+            texts: Paragraph texts
+            embeddings: Their embeddings
+            translations: Their translations
+        """
+        if self._entries is None:
+            self._load()
+        
+        rows = []
+        for text, embedding, translated_text in zip(texts, embeddings, translations):
+            vector = _normalize(embedding)
+            self._entries.append((vector, text, translated_text))
+            rows.append({
+                'scope': self.scope,
+                'text': text,
+                'embedding': vector.tobytes(),
+                'translated_text': translated_text
+            })
+        
+        if rows:
+            self.session.bulk_insert_mappings(SemanticCacheEntry, rows)
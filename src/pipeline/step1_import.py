@@ -8,12 +8,21 @@ with chapters, sections, and paragraphs using Hebrew titles from the schema.
 import json
 import re
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
+from sqlalchemy import insert, text
 from sqlalchemy.orm import Session
 
-from src.models import init_db, Chapter, Section, Paragraph
+from src.models import init_db_rw, Chapter, Section, Paragraph
 from src.utils import config
 
+try:
+    import orjson
+except ImportError:  # Optional speedup, see the "fast" extra in pyproject.toml
+    orjson = None
+
+# Matches any HTML tag, e.g. <b>, </i>, <br/>
+_TAG_RE = re.compile(r'<[^>]+>')
+
 
 def clean_html_tags(text: str) -> str:
     """
@@ -25,22 +34,30 @@ def clean_html_tags(text: str) -> str:
     Returns:
         Clean text without HTML tags
     """
-    # Remove HTML tags using regex
-    clean_text = re.sub(r'<[^>]+>', '', text)
-    return clean_text.strip()
+    # Most paragraphs have no markup at all, so skip the regex for them
+    if '<' not in text:
+        return text.strip()
+    
+    # Remove HTML tags using the precompiled regex
+    return _TAG_RE.sub('', text).strip()
 
 
 def load_json_book(json_path: Path) -> Dict[str, Any]:
     """Load the book JSON file."""
     print(f"Loading book from {json_path}...")
+    if orjson is not None:
+        with open(json_path, 'rb') as f:
+            return orjson.loads(f.read())
     with open(json_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
-def get_hebrew_titles(schema_nodes: List[Dict]) -> Dict[str, str]:
+def get_hebrew_titles(schema_nodes: List[Dict]) -> Dict[str, Tuple[str, Dict[str, str]]]:
     """
     Extract Hebrew titles from schema nodes.
-    Returns a dict mapping English titles to Hebrew titles.
+    Returns a dict mapping each English chapter title to a tuple of
+    (Hebrew chapter title, {English section title: Hebrew section title}).
+    Chapters without a Hebrew title keep their English title.
     """
     title_map = {}
     
@@ -48,18 +65,16 @@ def get_hebrew_titles(schema_nodes: List[Dict]) -> Dict[str, str]:
         en_title = node.get('enTitle', '')
         he_title = node.get('heTitle', '')
         
-        # Store main chapter title
-        if en_title and he_title:
-            title_map[en_title] = he_title
-        
         # Process section nodes if they exist
-        if 'nodes' in node:
-            for section_node in node['nodes']:
-                section_en = section_node.get('enTitle', '')
-                section_he = section_node.get('heTitle', '')
-                if section_en and section_he:
-                    # Create a composite key for sections: "ChapterTitle|SectionTitle"
-                    title_map[f"{en_title}|{section_en}"] = section_he
+        section_map = {}
+        for section_node in node.get('nodes', []):
+            section_en = section_node.get('enTitle', '')
+            section_he = section_node.get('heTitle', '')
+            if section_en and section_he:
+                section_map[section_en] = section_he
+        
+        if en_title and (he_title or section_map):
+            title_map[en_title] = (he_title or en_title, section_map)
     
     return title_map
 
@@ -77,113 +92,130 @@ def import_book(session: Session, book_data: Dict[str, Any]) -> None:
     nodes = schema.get('nodes', [])
     hebrew_titles = get_hebrew_titles(nodes)
     
-    print(f"Found {len(hebrew_titles)} Hebrew titles in schema")
+    title_count = sum(
+        (he_title != en_title) + len(section_map)
+        for en_title, (he_title, section_map) in hebrew_titles.items()
+    )
+    print(f"Found {title_count} Hebrew titles in schema")
     
     # Get the text content
     text_data = book_data.get('text', {})
     
-    chapter_number = 0
+    chapters = list(text_data.items())
+    chapter_number = len(chapters)
     total_paragraphs = 0
     
-    # Process each chapter
-    for english_title, content in text_data.items():
-        chapter_number += 1
-        
-        # Get Hebrew title for this chapter
-        hebrew_title = hebrew_titles.get(english_title, english_title)
+    # Import the whole book in a single transaction. Nothing is read back through
+    # the ORM until it's done, so don't autoflush even if the session is set to
+    with session.begin(), session.no_autoflush:
+        if session.get_bind().dialect.name == 'sqlite':
+            # Take the write lock up front instead of upgrading on the first INSERT
+            session.execute(text("BEGIN IMMEDIATE"))
         
-        print(f"\nProcessing Chapter {chapter_number}: {hebrew_title} ({english_title})")
+        # Insert all chapters in one statement and collect their IDs
+        chapter_titles = [hebrew_titles.get(english_title, (english_title, {})) for english_title, _ in chapters]
+        chapter_rows = [
+            {
+                'title': hebrew_title,
+                'chapter_number': number
+            }
+            for number, (hebrew_title, _) in enumerate(chapter_titles, start=1)
+        ]
+        chapter_ids = session.scalars(
+            insert(Chapter).returning(Chapter.id, sort_by_parameter_order=True),
+            chapter_rows
+        ).all()
         
-        # Create chapter
-        chapter = Chapter(
-            title=hebrew_title,
-            chapter_number=chapter_number
-        )
-        session.add(chapter)
-        session.flush()  # Get the chapter ID
-        
-        # Check if content is a dictionary (has sections) or a list (no sections)
-        if isinstance(content, dict):
-            # Content has sections
-            print(f"  Chapter has {len(content)} sections")
+        # Process each chapter
+        for (english_title, content), (hebrew_title, section_titles), chapter_row, chapter_id in zip(
+            chapters, chapter_titles, chapter_rows, chapter_ids
+        ):
+            
+            print(f"\nProcessing Chapter {chapter_row['chapter_number']}: {hebrew_title} ({english_title})")
+            
+            # Paragraph rows for this chapter, inserted in one batch at the end
+            paragraph_rows = []
             
-            section_number = 0
-            for section_english_title, section_content in content.items():
-                section_number += 1
+            # Check if content is a dictionary (has sections) or a list (no sections)
+            if isinstance(content, dict):
+                # Content has sections
+                print(f"  Chapter has {len(content)} sections")
                 
-                # Get Hebrew title for this section
-                # Empty string means unnamed section
-                if section_english_title:
-                    section_key = f"{english_title}|{section_english_title}"
-                    section_hebrew_title = hebrew_titles.get(section_key, section_english_title)
-                else:
-                    # Empty section title - use a numbered title
-                    section_hebrew_title = f"פרק {section_number}"
+                section_rows = []
+                for section_number, section_english_title in enumerate(content, start=1):
+                    # Get Hebrew title for this section
+                    # Empty string means unnamed section
+                    if section_english_title:
+                        section_hebrew_title = section_titles.get(section_english_title, section_english_title)
+                    else:
+                        # Empty section title - use a numbered title
+                        section_hebrew_title = f"פרק {section_number}"
+                    
+                    section_rows.append({
+                        'chapter_id': chapter_id,
+                        'title': section_hebrew_title,
+                        'section_number': section_number
+                    })
                 
-                # Create section
-                section = Section(
-                    chapter_id=chapter.id,
-                    title=section_hebrew_title,
-                    section_number=section_number
-                )
-                session.add(section)
-                session.flush()
+                # Insert the chapter's sections in one statement and collect their IDs
+                section_ids = session.scalars(
+                    insert(Section).returning(Section.id, sort_by_parameter_order=True),
+                    section_rows
+                ).all() if section_rows else []
                 
-                # Add paragraphs to this section
-                # Section content might be a list of paragraphs or a list of lists (subsections)
-                if section_content and len(section_content) > 0 and isinstance(section_content[0], list):
-                    # Nested structure - flatten it
-                    paragraph_number = 0
-                    for subsection in section_content:
-                        for paragraph_text in subsection:
+                for section_content, section_row, section_id in zip(content.values(), section_rows, section_ids):
+                    # Add paragraphs to this section
+                    # Section content might be a list of paragraphs or a list of lists (subsections)
+                    if section_content and len(section_content) > 0 and isinstance(section_content[0], list):
+                        # Nested structure - flatten it
+                        paragraph_number = 0
+                        for subsection in section_content:
+                            for paragraph_text in subsection:
+                                clean_text = clean_html_tags(paragraph_text)
+                                if clean_text:  # Skip empty paragraphs
+                                    paragraph_number += 1
+                                    paragraph_rows.append({
+                                        'chapter_id': chapter_id,
+                                        'section_id': section_id,
+                                        'paragraph_number': paragraph_number,
+                                        'text': clean_text
+                                    })
+                        para_count = paragraph_number
+                    else:
+                        # Flat list of paragraphs
+                        para_count = 0
+                        for paragraph_number, paragraph_text in enumerate(section_content, start=1):
                             clean_text = clean_html_tags(paragraph_text)
                             if clean_text:  # Skip empty paragraphs
-                                paragraph_number += 1
-                                paragraph = Paragraph(
-                                    chapter_id=chapter.id,
-                                    section_id=section.id,
-                                    paragraph_number=paragraph_number,
-                                    text=clean_text
-                                )
-                                session.add(paragraph)
-                                total_paragraphs += 1
-                    para_count = paragraph_number
-                else:
-                    # Flat list of paragraphs
-                    para_count = 0
-                    for paragraph_number, paragraph_text in enumerate(section_content, start=1):
-                        clean_text = clean_html_tags(paragraph_text)
-                        if clean_text:  # Skip empty paragraphs
-                            paragraph = Paragraph(
-                                chapter_id=chapter.id,
-                                section_id=section.id,
-                                paragraph_number=paragraph_number,
-                                text=clean_text
-                            )
-                            session.add(paragraph)
-                            total_paragraphs += 1
-                            para_count += 1
+                                paragraph_rows.append({
+                                    'chapter_id': chapter_id,
+                                    'section_id': section_id,
+                                    'paragraph_number': paragraph_number,
+                                    'text': clean_text
+                                })
+                                para_count += 1
+                    
+                    print(f"    Section {section_row['section_number']} ({section_row['title']}): {para_count} paragraphs")
+            
+            else:
+                # Content is a flat list of paragraphs (no sections)
+                print(f"  Chapter has {len(content)} paragraphs (no sections)")
                 
-                print(f"    Section {section_number} ({section_hebrew_title}): {para_count} paragraphs")
-        
-        else:
-            # Content is a flat list of paragraphs (no sections)
-            print(f"  Chapter has {len(content)} paragraphs (no sections)")
+                for paragraph_number, paragraph_text in enumerate(content, start=1):
+                    clean_text = clean_html_tags(paragraph_text)
+                    if clean_text:  # Skip empty paragraphs
+                        paragraph_rows.append({
+                            'chapter_id': chapter_id,
+                            'section_id': None,  # No section
+                            'paragraph_number': paragraph_number,
+                            'text': clean_text
+                        })
             
-            for paragraph_number, paragraph_text in enumerate(content, start=1):
-                clean_text = clean_html_tags(paragraph_text)
-                if clean_text:  # Skip empty paragraphs
-                    paragraph = Paragraph(
-                        chapter_id=chapter.id,
-                        section_id=None,  # No section
-                        paragraph_number=paragraph_number,
-                        text=clean_text
-                    )
-                    session.add(paragraph)
-                    total_paragraphs += 1
+            # Insert all of the chapter's paragraphs at once
+            if paragraph_rows:
+                session.bulk_insert_mappings(Paragraph, paragraph_rows)
+                total_paragraphs += len(paragraph_rows)
     
-    # Commit all changes
-    session.commit()
     print(f"\n{'='*60}")
     print(f"Import completed successfully!")
     print(f"Imported {chapter_number} chapters with {total_paragraphs} total paragraphs")
@@ -194,7 +226,7 @@ def main():
     """Main function to run the import process."""
     # Initialize database
     print("Initializing database...")
-    engine, SessionLocal = init_db(config.database_url)
+    write_engine, WriteSession, ReadSession = init_db_rw(config.database_url)
     
     # Get the JSON file path
     json_file = config.assets_dir / "Duties of the Heart - he - Vocalized Edition (1).json"
@@ -207,7 +239,7 @@ def main():
     book_data = load_json_book(json_file)
     
     # Import into database
-    session = SessionLocal()
+    session = WriteSession()
     try:
         import_book(session, book_data)
     except Exception as e:
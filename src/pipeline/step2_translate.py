@@ -7,136 +7,1136 @@ This script translates medieval Hebrew text to modern Hebrew while:
 - Handling sections in manageable chunks
 """
 
+import argparse
+import asyncio
+import hashlib
+import itertools
 import json
-from typing import List, Dict, Optional
-from datetime import datetime
-from sqlalchemy.orm import Session
-from openai import OpenAI
+import logging
+import random
+import re
+import time
+from types import SimpleNamespace
+from functools import lru_cache
+from typing import Any, Callable, List, Dict, Optional, Tuple
+from sqlalchemy.orm import Session, joinedload
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, OpenAI, RateLimitError
 
-from src.models import init_db, Chapter, Section, Paragraph, Translation
-from src.utils import config
+from src.models import init_db, insert_or_ignore, query_in_chunks, upsert, Chapter, Section, Paragraph, Translation, TranslationCache
+from src.utils import config, configure_logging
+from src.pipeline.semantic_cache import SemanticCache
+
+try:
+    import tiktoken
+except ImportError:  # Optional, see the "fast" extra in pyproject.toml
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+
+# Part of every response cache key. Bump it whenever the instructions that
+# build_request wraps around the configured system prompt change.
+PROMPT_TEMPLATE_VERSION = 2
+
+# Strict instructions about maintaining structure and quotes, added to the
+# configured system prompt. They don't depend on the request (the paragraph
+# counts are given in the user message), so every request starts with the same
+# system prompt, and OpenAI's prompt caching can reuse that prefix.
+_CRITICAL_INSTRUCTIONS = """CRITICAL INSTRUCTIONS:
+1. You MUST return EXACTLY as many translated paragraphs as you are given, with the same numbers
+2. Each paragraph must start with its number in brackets: [1], [2], [3], etc.
+3. DO NOT translate biblical quotes, Talmudic quotes, or any quoted text from traditional sources
+4. Biblical verses (תהלים, משלי, ישעיה, דברים, etc.) must remain in their original medieval Hebrew
+5. Talmudic/Midrashic quotes must remain in their original form
+6. Only translate the author's own explanatory text
+7. Maintain the exact same paragraph structure - no merging or splitting
+8. If a paragraph contains both a quote and explanation, translate only the explanation
+
+Example format:
+[1] translated first paragraph...
+[2] translated second paragraph...
+[3] translated third paragraph...
+"""
+
+# The same, for packed requests (see TranslationService.build_packed_request)
+_PACKED_CRITICAL_INSTRUCTIONS = """CRITICAL INSTRUCTIONS:
+1. The text consists of several sections. You MUST return EXACTLY as many translated paragraphs as you are given, with the same numbers
+2. Each paragraph must start with its section and paragraph number in brackets: [S1-P1], [S1-P2], [S2-P1], etc.
+3. DO NOT translate biblical quotes, Talmudic quotes, or any quoted text from traditional sources
+4. Biblical verses (תהלים, משלי, ישעיה, דברים, etc.) must remain in their original medieval Hebrew
+5. Talmudic/Midrashic quotes must remain in their original form
+6. Only translate the author's own explanatory text
+7. Maintain the exact same paragraph structure - no merging or splitting, and never move text between sections
+8. If a paragraph contains both a quote and explanation, translate only the explanation
+
+Example format:
+[S1-P1] translated first paragraph of the first section...
+[S1-P2] translated second paragraph of the first section...
+[S2-P1] translated first paragraph of the second section...
+"""
+
+# Matches one component of a rate limit reset duration, e.g. "6m0s" or "120ms"
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def _parse_reset_duration(value: Optional[str]) -> float:
+    """Convert an x-ratelimit-reset-* header value (e.g. "1m30s") to seconds."""
+    if not value:
+        return 0.0
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_RE.findall(value))
+
+
+# Transient API errors worth retrying: 429, network problems/timeouts and 5xx
+_RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a request that failed with error.
+    
+    Uses the server's Retry-After header when it sends one, and otherwise
+    exponential backoff (1s, 2s, 4s, ... up to 60s) with up to a second of jitter.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None:
+        headers = response.headers
+        try:
+            if headers.get('retry-after-ms') is not None:
+                return float(headers['retry-after-ms']) / 1000
+            if headers.get('retry-after') is not None:
+                return float(headers['retry-after'])
+        except ValueError:
+            pass  # e.g. Retry-After given as an HTTP date
+    return min(60.0, 2 ** attempt + random.random())
+
+
+# Matches a paragraph number marker in a response, e.g. [5]
+_NUMBERED_RE = re.compile(r'\n*\[(\d+)\]\s*')
+
+# Matches a section/paragraph marker in a packed response, e.g. [S2-P5], along
+# with a preceding === SECTION k === header if the model repeats it
+_PACKED_MARKER_RE = re.compile(r'(?:\s*=== SECTION \d+ ===)?\n*\[S(\d+)-P(\d+)\]\s*')
+
+
+@lru_cache(maxsize=64)
+def _numbered_user_message(texts: Tuple[str, ...]) -> str:
+    """
+    User message asking to translate the numbered paragraphs.
+    
+    Memoized, since a section's request may be built more than once (e.g. for
+    the Batch API and again when it's retried directly). It's keyed on the texts
+    rather than paragraph ids, so a re-imported paragraph is never sent stale.
+    """
+    input_text = "\n\n".join(f"[{i}] {text}" for i, text in enumerate(texts, 1))
+    return f"""Translate the following {len(texts)} paragraphs from medieval Hebrew to modern Hebrew.
+You MUST return EXACTLY {len(texts)} translated paragraphs, numbered [1] through [{len(texts)}].
+Remember: DO NOT translate quotes from Torah, Prophets, Writings, Talmud, or Midrash.
+
+{input_text}"""
+
+
+def _pack_greedily(items: List[Any], sizes: List[int], budget: float) -> List[List[Any]]:
+    """
+    Group consecutive items so each group's total size stays within budget.
+    
+    An item over the budget on its own gets a group of its own.
+    """
+    groups = []
+    group, group_size = [], 0
+    for item, size in zip(items, sizes):
+        if group and group_size + size > budget:
+            groups.append(group)
+            group, group_size = [], 0
+        group.append(item)
+        group_size += size
+    
+    if group:
+        groups.append(group)
+    return groups
+
+
+class NumberingGapError(ValueError):
+    """
+    A response skipped or repeated a paragraph number.
+    
+    The paragraphs before the gap came back in order, so they can be kept and
+    only the rest sent again.
+    
+    Attributes:
+        missing_index: Index (from 0, counting across the request's sections) of
+                       the paragraph whose number was expected at the gap
+        translations: Translations of the paragraphs before it
+    """
+    
+    def __init__(self, message: str, translations: List[str]):
+        super().__init__(message)
+        self.translations = translations
+        self.missing_index = len(translations)
+
+
+def _marker_spans(marker_re, text: str):
+    """Yield each marker match in text with the end of its paragraph (the next marker's start)."""
+    matches = list(marker_re.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        yield match, end
+
+
+class _StreamedCompletion:
+    """
+    Collects a streamed chat completion, checking its paragraph markers as they arrive.
+    
+    The markers must come in order ([1], [2], ... or [S1-P1], [S1-P2], [S2-P1], ...),
+    so a skipped or repeated paragraph is noticed while the model is still
+    generating, and the request can be cancelled instead of paying for the rest.
+    """
+    
+    def __init__(self, expected_counts: List[int]):
+        # The markers expected, in order, as (numbers, label)
+        if len(expected_counts) == 1:
+            self._marker_re = _NUMBERED_RE
+            self._expected = [((i,), f"[{i}]") for i in range(1, expected_counts[0] + 1)]
+        else:
+            self._marker_re = _PACKED_MARKER_RE
+            self._expected = [
+                ((k, i), f"[S{k}-P{i}]")
+                for k, count in enumerate(expected_counts, 1)
+                for i in range(1, count + 1)
+            ]
+        self._seen = 0
+        
+        self._chunks = []
+        # Text after the last marker found (a marker may arrive split over chunks)
+        self._tail = ''
+        self._refusal = []
+        self._finish_reason = None
+        self._usage = None
+    
+    def add(self, chunk):
+        """
+        Add a streamed chunk.
+        
+        Raises:
+            NumberingGapError: If a paragraph marker is out of order
+            ValueError: If there are too many paragraphs
+        """
+        if chunk.usage is not None:
+            self._usage = chunk.usage
+        if not chunk.choices:
+            return
+        
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self._finish_reason = choice.finish_reason
+        if getattr(choice.delta, 'refusal', None):
+            self._refusal.append(choice.delta.refusal)
+        
+        content = choice.delta.content
+        if not content:
+            return
+        self._chunks.append(content)
+        
+        self._tail += content
+        match = self._marker_re.search(self._tail)
+        while match:
+            numbers = tuple(int(group) for group in match.groups())
+            if self._seen >= len(self._expected):
+                raise ValueError(
+                    f"Translation mismatch! Got paragraph {match.group().strip()} after the last expected paragraph."
+                )
+            expected_numbers, expected_label = self._expected[self._seen]
+            if numbers != expected_numbers:
+                # The paragraphs so far end where this marker starts
+                text = ''.join(self._chunks)
+                before = text[:len(text) - len(self._tail) + match.start()]
+                raise NumberingGapError(
+                    f"Translation mismatch! Got paragraph {match.group().strip()} while streaming, "
+                    f"expected {expected_label}.",
+                    [before[m.end():end].strip() for m, end in _marker_spans(self._marker_re, before)]
+                )
+            self._seen += 1
+            self._tail = self._tail[match.end():]
+            match = self._marker_re.search(self._tail)
+    
+    def as_response(self):
+        """The complete response, shaped like a (non-streamed) chat completion."""
+        message = SimpleNamespace(
+            content=''.join(self._chunks),
+            refusal=''.join(self._refusal) or None
+        )
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason=self._finish_reason)],
+            usage=self._usage
+        )
 
 
 class TranslationService:
     """Service for translating text using OpenAI API."""
     
-    def __init__(self, prompt_name: str = "modern"):
+    def __init__(self, prompt_name: str = "modern", cache_session: Optional[Session] = None):
         """
         Initialize the translation service.
         
         Args:
             prompt_name: Name of the prompt to use from config.yaml
+            cache_session: Database session for the response cache. When given,
+                           paragraphs translated before with the same prompt and
+                           model are taken from the translation_cache table instead
+                           of being sent again, and new translations are added to it
+                           (committed along with the caller's next commit).
         """
         self.client = OpenAI(api_key=config.openai_api_key)
         self.prompt_config = config.get_prompt(prompt_name)
         self.prompt_name = prompt_name
         self.model = config.openai_model
+        self.cache_session = cache_session
         
         if not self.prompt_config:
             raise ValueError(f"Prompt '{prompt_name}' not found in config.yaml")
+        
+        # System prompts, built once so they are identical across requests
+        system_prompt = self.prompt_config.get('system_prompt', '')
+        self._system_prompt = f"{system_prompt}\n\n{_CRITICAL_INSTRUCTIONS}"
+        self._packed_system_prompt = f"{system_prompt}\n\n{_PACKED_CRITICAL_INSTRUCTIONS}"
+        
+        # Identifies the prompt in cache keys (prompt_name may be changed for storage)
+        self._cache_prompt_id = "|".join((
+            prompt_name,
+            str(PROMPT_TEMPLATE_VERSION),
+            hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+        ))
+        
+        # Optional semantic cache for near-identical paragraphs (stored alongside the response cache)
+        self.semantic_cache = None
+        if cache_session is not None and config.get('semantic_cache.enabled', False):
+            self.embedding_model = config.get('semantic_cache.embedding_model', 'text-embedding-3-small')
+            self.semantic_cache = SemanticCache(
+                cache_session,
+                scope=f"{self._cache_prompt_id}|{self.model}",
+                threshold=config.get('semantic_cache.threshold', 0.95),
+                max_word_diff=config.get('semantic_cache.max_word_diff', 2)
+            )
+        
+        # Stream responses, so a response that goes wrong can be cancelled early
+        self.stream = config.get('openai.stream', True)
+        
+        # Newer reasoning models take no custom temperature and use max_completion_tokens
+        self._is_new_model = any(m in self.model for m in ['gpt-5', 'o1', 'o3'])
+        
+        # Send requests on the cheaper (but slower) Flex tier, for models that offer it
+        self.use_flex = config.get('openai.use_flex', True) and self._supports_flex()
+        self._flex_timeout = config.get('openai.flex_timeout', 900)
+        
+        # Request settings, read once rather than on every request
+        self._temperature = config.get('openai.temperature', 0.3)
+        self._max_tokens = config.get('openai.max_tokens', 4000)
+        self._max_retries = config.get('pipeline.max_retries', 3)
+        self._max_input_tokens = config.get('pipeline.max_input_tokens', 8000)
+        
+        # Sizing of each request's output token limit (see _output_token_limit)
+        self.output_token_ratio = config.get('openai.output_token_ratio', 1.5)
+        self.reasoning_token_headroom = config.get('openai.reasoning_token_headroom', 3000)
+        
+        # tiktoken encoding for count_tokens (looked up on first use; False if unavailable)
+        self._encoding = None if tiktoken is not None else False
+        
+        # Async client for translate_all (created on first use)
+        self._async_client = None
+        # Monotonic time until which new async requests wait, set when the
+        # rate limit headers say the per-minute quota is (nearly) used up
+        self._rate_limit_pause_until = 0.0
+        
+        # Optional cap on async requests started per minute, and the monotonic
+        # time the next one may start
+        self.requests_per_minute = config.get('pipeline.requests_per_minute')
+        self._next_request_at = 0.0
     
     def translate_section(self, paragraphs: List[Paragraph]) -> List[str]:
         """
         Translate a section (list of paragraphs) to modern Hebrew.
         
+        Transient API errors (429, connection errors, 5xx) are retried up to
+        pipeline.max_retries times, waiting as the server's Retry-After header
+        asks, or with exponential backoff.
+        
         Args:
             paragraphs: List of Paragraph objects to translate
-            
+        
         Returns:
             List of translated paragraph texts (same length as input)
         """
+        return self.translate_sections([paragraphs])[0]
+    
+    def translate_sections(self, sections: List[List[Paragraph]]) -> List[List[str]]:
+        """
+        Translate several sections in as few requests as fit the token budget.
+        
+        Small sections share a request (see pack_sections), and a section too
+        large for one request is split into chunks (see chunk_paragraphs).
+        
+        Args:
+            sections: Paragraph lists, one per section
+        
+        Returns:
+            For each section, its translated paragraph texts (same length as input)
+        """
+        paragraphs = [para for section in sections for para in section]
         if not paragraphs:
-            return []
+            return [[] for _ in sections]
         
-        # Build the input text with numbered paragraphs
-        numbered_input = []
-        for i, para in enumerate(paragraphs, 1):
-            numbered_input.append(f"[{i}] {para.text}")
+        results = self._cached_translations(paragraphs)
+        missing = [i for i, result in enumerate(results) if result is None]
         
-        input_text = "\n\n".join(numbered_input)
+        embeddings = {}
+        if missing and self.semantic_cache is not None:
+            embeddings = dict(zip(missing, self._embed([paragraphs[i].text for i in missing])))
+            missing = self._apply_semantic_cache(paragraphs, missing, embeddings, results)
         
-        # Create the system prompt
-        system_prompt = self.prompt_config.get('system_prompt', '')
+        if missing:
+            # One request at a time, each within the token budget. Each request's
+            # translations are cached as soon as it returns, so if a later one fails,
+            # translating the section again only resends the paragraphs still missing.
+            groups = self._group_by_section(sections, missing)
+            for request, request_missing in self._plan_requests(groups, missing):
+                translations = self._request_translations(request)
+                self._store_translations(paragraphs, request_missing, embeddings, translations, results)
         
-        # Add strict instructions about maintaining structure and quotes
-        enhanced_system_prompt = f"""{system_prompt}
-
-CRITICAL INSTRUCTIONS:
-1. You MUST return EXACTLY {len(paragraphs)} translated paragraphs, numbered [1] through [{len(paragraphs)}]
-2. Each paragraph must start with its number in brackets: [1], [2], [3], etc.
-3. DO NOT translate biblical quotes, Talmudic quotes, or any quoted text from traditional sources
-4. Biblical verses (תהלים, משלי, ישעיה, דברים, etc.) must remain in their original medieval Hebrew
-5. Talmudic/Midrashic quotes must remain in their original form
-6. Only translate the author's own explanatory text
-7. Maintain the exact same paragraph structure - no merging or splitting
-8. If a paragraph contains both a quote and explanation, translate only the explanation
-
-Example format:
-[1] translated first paragraph...
-[2] translated second paragraph...
-[3] translated third paragraph...
-"""
+        return self._split_by_section(sections, results)
+    
+    def _request_translations(self, groups: List[List[Paragraph]]) -> List[str]:
+        """
+        Send one or more sections' paragraphs to the API and return their translations.
         
-        # User message
-        user_message = f"""Translate the following {len(paragraphs)} paragraphs from medieval Hebrew to modern Hebrew.
-Remember: DO NOT translate quotes from Torah, Prophets, Writings, Talmud, or Midrash.
-
-{input_text}"""
+        If the response's numbering has a gap, the paragraphs before it are kept
+        and only the rest are sent again (see _resume_after_gap).
+        """
+        try:
+            return self._send_request(groups)
+        except NumberingGapError as e:
+            kept, remaining = self._resume_after_gap(groups, e)
+            return kept + self._request_translations(remaining)
+    
+    def _send_request(self, groups: List[List[Paragraph]]) -> List[str]:
+        """Make one request (retrying transient errors) and parse its translations."""
+        api_params = self._build_group_request(groups)
+        expected_counts = [len(group) for group in groups]
+        
+        self._log_request(groups)
+        
+        max_retries = self._max_retries
+        attempt = 0
+        while True:
+            try:
+                response = self.client.chat.completions.create(**api_params)
+                if self.stream:
+                    response = self._read_stream(response, expected_counts)
+                break
+            except _RETRYABLE_ERRORS as e:
+                if attempt == max_retries:
+                    if not self._fall_back_from_flex(api_params, e):
+                        raise
+                    attempt = 0
+                    continue
+                delay = _retry_delay(e, attempt)
+                logger.warning("  %s, retrying in %.1fs...", type(e).__name__, delay)
+                time.sleep(delay)
+                attempt += 1
+        
+        return self._handle_response(response, expected_counts)
+    
+    async def atranslate_section(self, paragraphs: List[Paragraph]) -> List[str]:
+        """
+        Async version of translate_section.
+        
+        Waits while the rate limit quota is exhausted. Like translate_section, retries
+        transient errors (429, connection errors, 5xx) with exponential backoff.
+        
+        Args:
+            paragraphs: List of Paragraph objects to translate
+        
+        Returns:
+            List of translated paragraph texts (same length as input)
+        """
+        return (await self.atranslate_sections([paragraphs]))[0]
+    
+    async def atranslate_sections(self, sections: List[List[Paragraph]]) -> List[List[str]]:
+        """Async version of translate_sections."""
+        paragraphs = [para for section in sections for para in section]
+        if not paragraphs:
+            return [[] for _ in sections]
+        
+        results = self._cached_translations(paragraphs)
+        missing = [i for i, result in enumerate(results) if result is None]
+        
+        embeddings = {}
+        if missing and self.semantic_cache is not None:
+            embeddings = dict(zip(missing, await self._aembed([paragraphs[i].text for i in missing])))
+            missing = self._apply_semantic_cache(paragraphs, missing, embeddings, results)
+        
+        if missing:
+            # Requests within the token budget, sent concurrently (and cached as
+            # each one returns, as in translate_sections)
+            groups = self._group_by_section(sections, missing)
+            
+            async def request_and_store(request, request_missing):
+                translations = await self._arequest_translations(request)
+                self._store_translations(paragraphs, request_missing, embeddings, translations, results)
+            
+            outcomes = await asyncio.gather(
+                *(
+                    request_and_store(request, request_missing)
+                    for request, request_missing in self._plan_requests(groups, missing)
+                ),
+                return_exceptions=True
+            )
+            for outcome in outcomes:
+                if isinstance(outcome, BaseException):
+                    raise outcome
+        
+        return self._split_by_section(sections, results)
+    
+    async def _arequest_translations(self, groups: List[List[Paragraph]]) -> List[str]:
+        """Async version of _request_translations."""
+        try:
+            return await self._asend_request(groups)
+        except NumberingGapError as e:
+            kept, remaining = self._resume_after_gap(groups, e)
+            return kept + await self._arequest_translations(remaining)
+    
+    async def _asend_request(self, groups: List[List[Paragraph]]) -> List[str]:
+        """Async version of _send_request, with rate limit handling."""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=config.openai_api_key)
+        
+        api_params = self._build_group_request(groups)
+        expected_counts = [len(group) for group in groups]
+        
+        self._log_request(groups)
+        
+        max_retries = self._max_retries
+        attempt = 0
+        while True:
+            await self._wait_for_request_slot()
+            
+            try:
+                raw_response = await self._async_client.chat.completions.with_raw_response.create(**api_params)
+                self._update_rate_limit(raw_response.headers)
+                response = raw_response.parse()
+                if self.stream:
+                    response = await self._aread_stream(response, expected_counts)
+                break
+            except _RETRYABLE_ERRORS as e:
+                if attempt == max_retries:
+                    if not self._fall_back_from_flex(api_params, e):
+                        raise
+                    attempt = 0
+                    continue
+                delay = _retry_delay(e, attempt)
+                logger.warning("  %s, retrying in %.1fs...", type(e).__name__, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+        
+        return self._handle_response(response, expected_counts)
+    
+    async def _wait_for_request_slot(self):
+        """Wait until a new async request may start (rate limit pause and requests_per_minute)."""
+        now = time.monotonic()
+        start = max(now, self._rate_limit_pause_until)
+        if self.requests_per_minute:
+            # Take the next slot now, so concurrent requests are spaced out between them
+            start = max(start, self._next_request_at)
+            self._next_request_at = start + 60.0 / self.requests_per_minute
+        if start > now:
+            await asyncio.sleep(start - now)
+    
+    @staticmethod
+    def _resume_after_gap(
+        groups: List[List[Paragraph]],
+        error: NumberingGapError
+    ) -> Tuple[List[str], List[List[Paragraph]]]:
+        """
+        Split a request whose response had a numbering gap into what to keep and what to resend.
+        
+        The paragraph just before the gap may have absorbed the skipped one, so
+        it is resent as well.
+        
+        Returns:
+            (translations to keep, the paragraphs still to translate grouped by section)
+        
+        Raises:
+            NumberingGapError: If nothing can be kept (resending would repeat the request)
+        """
+        kept = error.translations[:-1]
+        if not kept:
+            raise error
+        
+        logger.warning(
+            "  Paragraph numbering broke off after %d of %d paragraphs, resending the rest...",
+            error.missing_index, sum(len(group) for group in groups)
+        )
+        remaining, skip = [], len(kept)
+        for group in groups:
+            if skip < len(group):
+                remaining.append(group[skip:])
+            skip = max(0, skip - len(group))
+        return kept, remaining
+    
+    @staticmethod
+    def _fall_back_from_flex(api_params: Dict[str, Any], error: Exception) -> bool:
+        """
+        Move a Flex request whose retries ran out to the standard tier.
+        
+        Flex capacity can be unavailable for a while (429 Resource Unavailable),
+        so rather than failing the section, it is sent again at the standard price.
+        
+        Returns:
+            Whether the request was moved (and should be retried)
+        """
+        if api_params.get("service_tier") != "flex" or not isinstance(error, RateLimitError):
+            return False
+        del api_params["service_tier"]
+        api_params.pop("timeout", None)
+        logger.warning("  Flex processing unavailable, retrying on the standard tier...")
+        return True
+    
+    @staticmethod
+    def _read_stream(stream, expected_counts: List[int]):
+        """Read a streamed response, closing the stream early if its numbering goes wrong."""
+        completion = _StreamedCompletion(expected_counts)
+        try:
+            for chunk in stream:
+                completion.add(chunk)
+        except ValueError:
+            stream.close()
+            raise
+        return completion.as_response()
+    
+    @staticmethod
+    async def _aread_stream(stream, expected_counts: List[int]):
+        """Async version of _read_stream."""
+        completion = _StreamedCompletion(expected_counts)
+        try:
+            async for chunk in stream:
+                completion.add(chunk)
+        except ValueError:
+            await stream.close()
+            raise
+        return completion.as_response()
+    
+    @staticmethod
+    def _group_by_section(sections: List[List[Paragraph]], indices: List[int]) -> List[List[Paragraph]]:
+        """The paragraphs at (flattened, ascending) indices, grouped by the section they belong to."""
+        located = [(k, para) for k, section in enumerate(sections) for para in section]
+        return [
+            [para for _, para in group]
+            for _, group in itertools.groupby((located[i] for i in indices), key=lambda item: item[0])
+        ]
+    
+    @staticmethod
+    def _split_by_section(sections: List[List[Any]], results: List[str]) -> List[List[str]]:
+        """Split a flat list of results back into one list per section."""
+        split = []
+        offset = 0
+        for section in sections:
+            split.append(results[offset:offset + len(section)])
+            offset += len(section)
+        return split
+    
+    def _log_request(self, groups: List[List[Paragraph]]):
+        """Log a summary of a request's input."""
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        
+        logger.info("  Calling OpenAI API (%s)...", self.model)
+        paragraph_count = sum(len(group) for group in groups)
+        char_count = sum(len(para.text) for group in groups for para in group)
+        if len(groups) > 1:
+            logger.info("  Input: %d paragraphs, ~%d characters in %d sections", paragraph_count, char_count, len(groups))
+        else:
+            logger.info("  Input: %d paragraphs, ~%d characters", paragraph_count, char_count)
+    
+    def cache_key(self, text: str) -> str:
+        """Response cache key for a paragraph translated with this service's prompt and model."""
+        key_source = f"{self._cache_prompt_id}|{self.model}|{text}"
+        return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+    
+    def cache_translations(self, paragraphs: List[Paragraph], translations: List[str]):
+        """Add translations to the response cache (if enabled)."""
+        if self.cache_session is None or not paragraphs:
+            return
+        
+        # Keyed by cache key, so identical paragraphs are only inserted once
+        rows = {
+            self.cache_key(para.text): {
+                'key': self.cache_key(para.text),
+                'translated_text': trans_text,
+                'model': self.model
+            }
+            for para, trans_text in zip(paragraphs, translations)
+        }
+        insert_or_ignore(self.cache_session, TranslationCache, list(rows.values()))
+    
+    def _cached_translations(self, paragraphs: List[Paragraph]) -> List[Optional[str]]:
+        """Fetch the paragraphs' cached translations in a single query (None for misses)."""
+        if self.cache_session is None:
+            return [None] * len(paragraphs)
+        
+        keys = [self.cache_key(para.text) for para in paragraphs]
+        cached = dict(query_in_chunks(
+            self.cache_session.query(TranslationCache.key, TranslationCache.translated_text),
+            TranslationCache.key,
+            set(keys)
+        ))
+        if cached:
+            hits = sum(1 for key in keys if key in cached)
+            logger.info("  Cache: %d/%d paragraphs already translated", hits, len(keys))
+        return [cached.get(key) for key in keys]
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts for the semantic cache."""
+        response = self.client.embeddings.create(model=self.embedding_model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
+    async def _aembed(self, texts: List[str]) -> List[List[float]]:
+        """Async version of _embed."""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=config.openai_api_key)
+        response = await self._async_client.embeddings.create(model=self.embedding_model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
+    def _apply_semantic_cache(
+        self,
+        paragraphs: List[Paragraph],
+        missing: List[int],
+        embeddings: Dict[int, List[float]],
+        results: List[Optional[str]]
+    ) -> List[int]:
+        """Fill in results from the semantic cache; returns the indices still missing."""
+        remaining = []
+        for i in missing:
+            match = self.semantic_cache.lookup(paragraphs[i].text, embeddings[i])
+            if match is None:
+                remaining.append(i)
+            else:
+                results[i] = match
         
-        print(f"  Calling OpenAI API ({self.model})...")
-        print(f"  Input: {len(paragraphs)} paragraphs, ~{len(input_text)} characters")
+        reused = len(missing) - len(remaining)
+        if reused:
+            logger.info("  Semantic cache: reused %d/%d translations of near-identical paragraphs", reused, len(missing))
+        return remaining
+    
+    def _store_translations(
+        self,
+        paragraphs: List[Paragraph],
+        missing: List[int],
+        embeddings: Dict[int, List[float]],
+        translations: List[str],
+        results: List[Optional[str]]
+    ):
+        """Cache fresh translations of paragraphs[missing] and put them in results."""
+        fresh = [paragraphs[i] for i in missing]
+        self.cache_translations(fresh, translations)
+        if self.semantic_cache is not None:
+            self.semantic_cache.add(
+                [para.text for para in fresh],
+                [embeddings[i] for i in missing],
+                translations
+            )
+        
+        for i, trans_text in zip(missing, translations):
+            results[i] = trans_text
+    
+    async def translate_all(
+        self,
+        sections: List[List[Paragraph]],
+        max_concurrent_requests: Optional[int] = None,
+        on_section_done: Optional[Callable[[int, Any], None]] = None
+    ) -> List[Any]:
+        """
+        Translate several sections concurrently.
+        
+        Sections too large for one request are split into chunks (see
+        chunk_paragraphs) that are translated concurrently, and small sections
+        are packed into shared requests (see pack_sections).
+        
+        Args:
+            sections: Paragraph lists, one per section
+            max_concurrent_requests: Maximum requests in flight at once
+                                     (default: pipeline.max_concurrent_requests)
+            on_section_done: Called with a section's index and its result as soon
+                             as the section's last request returns (on the event
+                             loop's thread), e.g. to save it while the others run
+        
+        Returns:
+            For each section (in order), its translations or the exception it raised
+        """
+        if max_concurrent_requests is None:
+            max_concurrent_requests = config.get('pipeline.max_concurrent_requests', 8)
+        sem = asyncio.Semaphore(max_concurrent_requests)
+        
+        # Each chunk remembers which section it came from
+        chunks, chunk_sections = [], []
+        section_chunks = [[] for _ in sections]
+        for k, section in enumerate(sections):
+            for chunk in self.chunk_paragraphs(section):
+                section_chunks[k].append(len(chunks))
+                chunks.append(chunk)
+                chunk_sections.append(k)
+        packs = self.pack_sections(chunks)
+        
+        results = [[] for _ in sections]
+        chunk_results = [None] * len(chunks)
+        remaining = [len(indices) for indices in section_chunks]
+        if on_section_done is not None:
+            # Empty sections have no requests to wait for
+            for k, count in enumerate(remaining):
+                if not count:
+                    on_section_done(k, results[k])
         
-        # Call OpenAI API
+        async def translate_pack(pack, first):
+            """Translate a pack (whose chunks start at index first) and finish the sections it completes."""
+            try:
+                pack_result = await self._translate_with_limit(sem, pack)
+            except Exception as e:
+                # A failed request fails every section with a chunk in it
+                pack_result = [e] * len(pack)
+            
+            for i, chunk_result in enumerate(pack_result, first):
+                chunk_results[i] = chunk_result
+                k = chunk_sections[i]
+                remaining[k] -= 1
+                if remaining[k]:
+                    continue
+                
+                section_results = [chunk_results[j] for j in section_chunks[k]]
+                errors = [r for r in section_results if isinstance(r, Exception)]
+                if errors:
+                    results[k] = errors[0]
+                else:
+                    results[k] = [text for r in section_results for text in r]
+                if on_section_done is not None:
+                    on_section_done(k, results[k])
+        
+        try:
+            firsts = itertools.accumulate((len(pack) for pack in packs[:-1]), initial=0)
+            await asyncio.gather(*(translate_pack(pack, first) for pack, first in zip(packs, firsts)))
+        finally:
+            # The client's connections belong to this event loop
+            if self._async_client is not None:
+                await self._async_client.close()
+                self._async_client = None
+        
+        return results
+    
+    async def _translate_with_limit(
+        self,
+        sem: asyncio.Semaphore,
+        sections: List[List[Paragraph]]
+    ) -> List[List[str]]:
+        """Translate a pack of sections once a slot in the semaphore is free."""
+        async with sem:
+            return await self.atranslate_sections(sections)
+    
+    def _token_encoding(self):
+        """The tiktoken encoding for this service's model, or None if it can't be loaded."""
+        if self._encoding is None:
+            try:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding('o200k_base')
+            except Exception as e:
+                # Encodings are downloaded on first use, which fails offline
+                logger.warning("  Could not load a tiktoken encoding (%s), estimating token counts", e)
+                self._encoding = False
+        return self._encoding if self._encoding is not False else None
+    
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens in text for this service's model.
+        
+        Uses tiktoken when its encoding can be loaded, and otherwise a
+        conservative estimate of one token per character (pointed Hebrew runs
+        close to that with the older encodings).
+        """
+        encoding = self._token_encoding()
+        if encoding is None:
+            return len(text) + 1
+        return len(encoding.encode(text))
+    
+    def pack_sections(
+        self,
+        sections: List[List[Paragraph]],
+        max_input_tokens: Optional[int] = None
+    ) -> List[List[List[Paragraph]]]:
+        """
+        Group consecutive sections into packs that are translated in one request.
+        
+        Sending several small sections together spreads the system prompt over
+        more paragraphs. Sections are added to a pack while its paragraphs stay
+        within the token budget; a section that is over the budget on its own
+        gets a pack of its own.
+        
+        Args:
+            sections: Paragraph lists, one per section
+            max_input_tokens: Token budget for a request's input
+                              (default: pipeline.max_input_tokens)
+        
+        Returns:
+            Packs of sections, in order
+        """
+        section_tokens = [sum(self.count_tokens(para.text) for para in section) for section in sections]
+        return _pack_greedily(sections, section_tokens, self._paragraph_token_budget(max_input_tokens))
+    
+    def chunk_paragraphs(
+        self,
+        paragraphs: List[Paragraph],
+        max_input_tokens: Optional[int] = None
+    ) -> List[List[Paragraph]]:
+        """
+        Split a section into consecutive chunks that each fit in one request.
+        
+        A section near the context window (or output limit) would fail or be cut
+        off as a single request. Paragraphs are added to a chunk while it stays
+        within the token budget; a paragraph over the budget on its own gets a
+        chunk of its own.
+        
+        Args:
+            paragraphs: The section's paragraphs
+            max_input_tokens: Token budget for a request's input
+                              (default: pipeline.max_input_tokens)
+        
+        Returns:
+            Chunks of paragraphs, in order (a section that fits is a single chunk)
+        """
+        paragraph_tokens = [self.count_tokens(para.text) for para in paragraphs]
+        return _pack_greedily(paragraphs, paragraph_tokens, self._paragraph_token_budget(max_input_tokens))
+    
+    def _paragraph_token_budget(self, max_input_tokens: Optional[int] = None) -> float:
+        """Tokens of paragraph text that fit in one request."""
+        if max_input_tokens is None:
+            max_input_tokens = self._max_input_tokens
+        
+        # The translations come back in the same request, so the paragraphs must
+        # also fit the output limit (see _output_token_limit)
+        system_tokens = self.count_tokens(self._packed_system_prompt)
+        output_budget = (self._max_output_tokens() - self._reasoning_headroom()) / self.output_token_ratio
+        return min(max_input_tokens - system_tokens, output_budget)
+    
+    def _plan_requests(
+        self,
+        groups: List[List[Paragraph]],
+        indices: List[int]
+    ) -> List[Tuple[List[List[Paragraph]], List[int]]]:
+        """
+        Split and pack sections' paragraphs into requests that each fit the token budget.
+        
+        Args:
+            groups: Paragraphs grouped by section (see _group_by_section)
+            indices: The paragraphs' (flattened) indices, in the same order
+        
+        Returns:
+            (request, the indices of its paragraphs) for each request
+        """
+        chunks = [chunk for group in groups for chunk in self.chunk_paragraphs(group)]
+        planned = []
+        offset = 0
+        for request in self.pack_sections(chunks):
+            count = sum(len(chunk) for chunk in request)
+            planned.append((request, indices[offset:offset + count]))
+            offset += count
+        return planned
+    
+    def _update_rate_limit(self, headers):
+        """Pause new requests until the quota resets if the rate limit headers say it is used up."""
+        remaining_requests = headers.get('x-ratelimit-remaining-requests')
+        remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+        
+        pause = 0.0
+        if remaining_requests is not None and int(remaining_requests) <= 1:
+            pause = max(pause, _parse_reset_duration(headers.get('x-ratelimit-reset-requests')))
+        # Leave headroom for a full request (max_tokens is a rough per-request estimate)
+        if remaining_tokens is not None and int(remaining_tokens) < self._max_tokens:
+            pause = max(pause, _parse_reset_duration(headers.get('x-ratelimit-reset-tokens')))
+        
+        if pause > 0:
+            logger.warning("  Rate limit nearly exhausted, pausing new requests for %.1fs", pause)
+            self._rate_limit_pause_until = max(self._rate_limit_pause_until, time.monotonic() + pause)
+    
+    def _handle_response(self, response, expected_counts: List[int]) -> List[str]:
+        """Check a chat completion response and parse its translations (of one or more sections)."""
+        # Extract the response
+        translated_text = response.choices[0].message.content
+        
+        # Debug: Check if we have a refusal or other issue
+        if hasattr(response.choices[0].message, 'refusal') and response.choices[0].message.refusal:
+            logger.error("  Model refused to respond: %s", response.choices[0].message.refusal)
+            raise ValueError(f"Model refused: {response.choices[0].message.refusal}")
+        
+        if not translated_text:
+            logger.warning("  Warning: Empty response from model!")
+            logger.warning("  Response object: %s", response)
+            logger.warning("  Finish reason: %s", response.choices[0].finish_reason)
+            raise ValueError("Model returned empty response")
+        
+        logger.info("  Response: ~%d characters", len(translated_text))
+        # A stream may end without its usage chunk, which leaves usage unset
+        if response.usage is not None:
+            # Input tokens served from OpenAI's prompt cache (the shared system prompt prefix)
+            details = getattr(response.usage, 'prompt_tokens_details', None)
+            cached_tokens = getattr(details, 'cached_tokens', None) or 0
+            logger.info(
+                "  Tokens used: %d input (%d cached), %d output",
+                response.usage.prompt_tokens, cached_tokens, response.usage.completion_tokens
+            )
+        
+        if len(expected_counts) == 1:
+            return self.parse_translations(translated_text, expected_counts[0])
+        
+        sections = self.parse_packed_translations(translated_text, expected_counts)
+        return [trans_text for section in sections for trans_text in section]
+    
+    def _build_group_request(self, groups: List[List[Paragraph]]) -> Dict[str, Any]:
+        """Request for one section's paragraphs, or a packed request for several (streamed if enabled)."""
+        if len(groups) == 1:
+            api_params = self.build_request(groups[0])
+        else:
+            api_params = self.build_packed_request(groups)
+        
+        if self.stream:
+            api_params["stream"] = True
+            api_params["stream_options"] = {"include_usage": True}
+        if self.use_flex:
+            # Flex requests can take much longer than the client's default timeout
+            api_params["service_tier"] = "flex"
+            api_params["timeout"] = self._flex_timeout
+        return api_params
+    
+    def _max_output_tokens(self) -> int:
+        """Largest output token limit a request may ask for with this service's model."""
+        if self._is_new_model:
+            # Reasoning models: internal reasoning also counts towards the limit
+            return self._max_tokens * 5
+        return self._max_tokens
+    
+    def _reasoning_headroom(self) -> int:
+        """Output tokens reserved for a reasoning model's internal reasoning."""
+        return self.reasoning_token_headroom if self._is_new_model else 0
+    
+    def _output_token_limit(self, user_message: str) -> int:
+        """
+        Output token limit for a request, sized from its input.
+        
+        The modern Hebrew translation runs a little longer than the medieval text,
+        so allow output_token_ratio times the input, plus reasoning headroom.
+        A tight limit reserves less of the tokens-per-minute quota per request
+        than the maximum would, leaving room for more concurrent requests.
+        Without an exact token count the limit stays at the maximum.
+        """
+        if self._token_encoding() is None:
+            return self._max_output_tokens()
+        estimate = int(self.count_tokens(user_message) * self.output_token_ratio) + self._reasoning_headroom()
+        return min(estimate, self._max_output_tokens())
+    
+    def _supports_flex(self) -> bool:
+        """Whether the model is offered on the Flex processing tier."""
+        return any(m in self.model for m in ['gpt-5', 'o3', 'o4-mini'])
+    
+    def _request_params(self, system_prompt: str, user_message: str) -> Dict[str, Any]:
+        """Chat completion parameters for the model, with its token limit."""
         # Note: gpt-5-mini and newer models use max_completion_tokens instead of max_tokens
         # and don't support custom temperature
         api_params = {
             "model": self.model,
             "messages": [
-                {"role": "system", "content": enhanced_system_prompt},
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_message}
             ],
         }
         
-        # Check if this is a newer model that has restrictions
-        is_new_model = any(m in self.model for m in ['gpt-5', 'o1', 'o3'])
-        
-        if is_new_model:
+        if self._is_new_model:
             # Newer reasoning models: use max_completion_tokens and default temperature
-            # Note: Reasoning models use many tokens for internal reasoning, so we need a much higher limit
-            # For gpt-5-mini, reasoning tokens can be substantial (2000-6000+)
+            # Note: Reasoning models use many tokens for internal reasoning, so the limit
+            # includes headroom for them (for gpt-5-mini they can be 2000-6000+)
             # We need to ensure: reasoning_tokens + output_tokens <= max_completion_tokens
-            # For safety, use a very high limit to prevent truncation
-            api_params["max_completion_tokens"] = config.get('openai.max_tokens', 4000) * 5  # 5x for large batches
+            api_params["max_completion_tokens"] = self._output_token_limit(user_message)
         else:
             # Older models: use max_tokens and custom temperature
-            api_params["temperature"] = config.get('openai.temperature', 0.3)
-            api_params["max_tokens"] = config.get('openai.max_tokens', 4000)
+            api_params["temperature"] = self._temperature
+            api_params["max_tokens"] = self._output_token_limit(user_message)
         
-        response = self.client.chat.completions.create(**api_params)
+        return api_params
+    
+    def build_request(self, paragraphs: List[Paragraph]) -> Dict[str, Any]:
+        """
+        Build the chat completion request for translating a list of paragraphs.
         
-        # Extract the response
-        translated_text = response.choices[0].message.content
+        Args:
+            paragraphs: List of Paragraph objects to translate
         
-        # Debug: Check if we have a refusal or other issue
-        if hasattr(response.choices[0].message, 'refusal') and response.choices[0].message.refusal:
-            print(f"  Model refused to respond: {response.choices[0].message.refusal}")
-            raise ValueError(f"Model refused: {response.choices[0].message.refusal}")
+        Returns:
+            Keyword arguments for client.chat.completions.create
+            (also usable as a Batch API request body)
+        """
+        # User message (the system prompt is the same for every request)
+        user_message = _numbered_user_message(tuple(para.text for para in paragraphs))
+        return self._request_params(self._system_prompt, user_message)
+    
+    def build_packed_request(self, sections: List[List[Paragraph]]) -> Dict[str, Any]:
+        """
+        Build a chat completion request translating several sections at once.
         
-        if not translated_text:
-            print(f"  Warning: Empty response from model!")
-            print(f"  Response object: {response}")
-            print(f"  Finish reason: {response.choices[0].finish_reason}")
-            raise ValueError("Model returned empty response")
+        Paragraphs are numbered [S<section>-P<paragraph>] (both from 1), and each
+        section starts with a === SECTION k === marker.
         
-        print(f"  Response: ~{len(translated_text)} characters")
-        print(f"  Tokens used: {response.usage.prompt_tokens} input, {response.usage.completion_tokens} output")
+        Args:
+            sections: Paragraph lists, one per section
         
+        Returns:
+            Keyword arguments for client.chat.completions.create
+        """
+        input_text = "\n\n".join(
+            f"=== SECTION {k} ===\n\n" + "\n\n".join(
+                f"[S{k}-P{i}] {para.text}" for i, para in enumerate(section, 1)
+            )
+            for k, section in enumerate(sections, 1)
+        )
+        counts = ", ".join(
+            f"section {k}: [S{k}-P1] through [S{k}-P{len(section)}]"
+            for k, section in enumerate(sections, 1)
+        )
+        paragraph_count = sum(len(section) for section in sections)
+        
+        user_message = f"""Translate the following {paragraph_count} paragraphs in {len(sections)} sections from medieval Hebrew to modern Hebrew.
+You MUST return EXACTLY {paragraph_count} translated paragraphs ({counts}).
+Remember: DO NOT translate quotes from Torah, Prophets, Writings, Talmud, or Midrash.
+
+{input_text}"""
+
+        return self._request_params(self._packed_system_prompt, user_message)
+    
+    def parse_translations(self, translated_text: str, expected_count: int) -> List[str]:
+        """
+        Parse the model's numbered response into one translation per paragraph.
+        
+        Args:
+            translated_text: Raw text returned by the model
+            expected_count: Number of paragraphs that were sent
+        
+        Returns:
+            List of translated paragraph texts
+        
+        Raises:
+            NumberingGapError: If a paragraph number is skipped or repeated
+            ValueError: If the number of parsed paragraphs doesn't match expected_count
+        """
         # Parse the numbered paragraphs
-        translations = self._parse_numbered_response(translated_text, len(paragraphs))
+        translations = self._parse_numbered_response(translated_text, expected_count)
         
-        if len(translations) != len(paragraphs):
+        if len(translations) != expected_count:
             raise ValueError(
-                f"Translation mismatch! Expected {len(paragraphs)} paragraphs, got {len(translations)}. "
+                f"Translation mismatch! Expected {expected_count} paragraphs, got {len(translations)}. "
                 f"This is a critical error - please check the LLM response."
             )
         
@@ -149,32 +1149,127 @@ Remember: DO NOT translate quotes from Torah, Prophets, Writings, Talmud, or Mid
         Args:
             response: Raw text from LLM with numbered paragraphs
             expected_count: Expected number of paragraphs
-            
+        
         Returns:
             List of paragraph texts (without numbers)
-        """
-        import re
         
-        # Split by paragraph numbers [1], [2], etc.
-        # Pattern matches [number] at the start of a line
-        parts = re.split(r'\n*\[(\d+)\]\s*', response)
-        
-        # parts[0] is any text before [1], parts[1] is "1", parts[2] is text after [1], etc.
-        # We want parts[2], parts[4], parts[6], etc. (the actual text)
+        Raises:
+            NumberingGapError: If a paragraph number is skipped or repeated
+        """
+        # Each paragraph is the text between its number ([1], [2], etc.) and the next one
+        # (any text before [1] is ignored)
         paragraphs = []
-        for i in range(1, len(parts), 2):
-            if i + 1 < len(parts):
-                paragraph_num = int(parts[i])
-                paragraph_text = parts[i + 1].strip()
-                paragraphs.append(paragraph_text)
+        for match, end in _marker_spans(_NUMBERED_RE, response):
+            paragraph_num = int(match.group(1))
+            if paragraph_num != len(paragraphs) + 1:
+                raise NumberingGapError(
+                    f"Translation mismatch! Got paragraph [{paragraph_num}], expected [{len(paragraphs) + 1}].",
+                    paragraphs
+                )
+            paragraphs.append(response[match.end():end].strip())
         
         # Validate we got the right number
         if len(paragraphs) != expected_count:
-            print(f"⚠️  Warning: Expected {expected_count} paragraphs, parsed {len(paragraphs)}")
-            print(f"Raw response (full):\n{response}\n")
-            print(f"Raw response preview:\n{response[:500]}...")
+            logger.warning("⚠️  Warning: Expected %d paragraphs, parsed %d", expected_count, len(paragraphs))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Raw response (full):\n%s\n", response)
+            logger.warning("Raw response preview:\n%s...", response[:500])
         
         return paragraphs
+    
+    def parse_packed_translations(self, translated_text: str, expected_counts: List[int]) -> List[List[str]]:
+        """
+        Parse the model's response to a packed request into translations per section.
+        
+        Args:
+            translated_text: Raw text returned by the model
+            expected_counts: Number of paragraphs sent for each section
+        
+        Returns:
+            For each section, its translated paragraph texts
+        
+        Raises:
+            NumberingGapError: If a paragraph is skipped, repeated or out of order
+            ValueError: If any section's paragraphs are missing or extra
+        """
+        sections = [[] for _ in expected_counts]
+        # The (section, paragraph) number of the next marker expected
+        expected = (1, 1)
+        translations = []
+        
+        # Each paragraph is the text between its marker and the next one
+        # (any text before the first marker is ignored)
+        for match, end in _marker_spans(_PACKED_MARKER_RE, translated_text):
+            section_num, paragraph_num = int(match.group(1)), int(match.group(2))
+            # A section's paragraphs are followed by the next section's. A missing
+            # paragraph is caught just below as an unexpected marker, unless it is
+            # at the end of the response (caught below with the count check).
+            while expected[0] < len(expected_counts) and expected[1] > expected_counts[expected[0] - 1]:
+                expected = (expected[0] + 1, 1)
+            if (section_num, paragraph_num) != expected:
+                raise NumberingGapError(
+                    f"Translation mismatch! Unexpected paragraph [S{section_num}-P{paragraph_num}] in packed response.",
+                    translations
+                )
+            trans_text = translated_text[match.end():end].strip()
+            sections[section_num - 1].append(trans_text)
+            translations.append(trans_text)
+            expected = (section_num, paragraph_num + 1)
+        
+        for k, (section, expected_count) in enumerate(zip(sections, expected_counts), 1):
+            if len(section) != expected_count:
+                logger.warning("⚠️  Warning: Section %d: expected %d paragraphs, parsed %d", k, expected_count, len(section))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Raw response (full):\n%s\n", translated_text)
+                logger.warning("Raw response preview:\n%s...", translated_text[:500])
+                raise ValueError(
+                    f"Translation mismatch! Section {k}: expected {expected_count} paragraphs, got {len(section)}. "
+                    f"This is a critical error - please check the LLM response."
+                )
+        
+        return sections
+
+
+def save_translations(
+    session: Session,
+    paragraphs: List[Paragraph],
+    translations: List[str],
+    prompt_name: str,
+    model: str
+) -> int:
+    """
+    Add or update the translations of paragraphs for a prompt (without committing).
+    
+    Args:
+        session: Database session
+        paragraphs: Translated paragraphs
+        translations: Translated texts, in the same order as paragraphs
+        prompt_name: Name to save translations under
+        model: Model that produced the translations
+    
+    Returns:
+        Number of translations saved
+    """
+    # One upsert for all the paragraphs, replacing earlier translations for the
+    # prompt (created_at is set by the database, see Translation.created_at)
+    rows = [
+        {
+            'paragraph_id': para.id,
+            'prompt_name': prompt_name,
+            'translated_text': trans_text,
+            'model': model
+        }
+        for para, trans_text in zip(paragraphs, translations)
+    ]
+    upsert(
+        session,
+        Translation,
+        rows,
+        index_elements=['paragraph_id', 'prompt_name'],
+        update_columns=['translated_text', 'model', 'created_at']
+    )
+    
+    return len(rows)
 
 
 def translate_section_to_db(
@@ -195,22 +1290,22 @@ def translate_section_to_db(
         chapter: Chapter to translate (if no sections)
         max_paragraphs: Maximum paragraphs to translate (for testing)
         dry_run: If True, don't save to database
-        
+    
     Returns:
         Dict with statistics
     """
-    # Get paragraphs
+    # Get paragraphs (the section's chapter is joined in, for its title)
     if section:
-        query = session.query(Paragraph).filter(
+        query = session.query(Paragraph).options(
+            joinedload(Paragraph.section).joinedload(Section.chapter)
+        ).filter(
             Paragraph.section_id == section.id
         ).order_by(Paragraph.paragraph_number)
-        location = f"{section.chapter.title} → {section.title}"
     elif chapter:
         query = session.query(Paragraph).filter(
             Paragraph.chapter_id == chapter.id,
             Paragraph.section_id == None
         ).order_by(Paragraph.paragraph_number)
-        location = chapter.title
     else:
         raise ValueError("Must provide either section or chapter")
     
@@ -218,6 +1313,7 @@ def translate_section_to_db(
         query = query.limit(max_paragraphs)
     
     paragraphs = query.all()
+    location = f"{section.chapter.title} → {section.title}" if section else chapter.title
     
     if not paragraphs:
         print(f"  No paragraphs to translate in {location}")
@@ -232,39 +1328,28 @@ def translate_section_to_db(
     # Translate
     try:
         translations = service.translate_section(paragraphs)
-        
-        # Save to database
-        saved = 0
-        for para, trans_text in zip(paragraphs, translations):
+    except Exception as e:
+        print(f"✗ Error during translation: {e}")
+        # Keep the cached translations of the requests that did succeed, so
+        # translating the section again only resends the rest
+        try:
             if dry_run:
+                session.rollback()
+            else:
+                session.commit()
+        except Exception:
+            session.rollback()
+        return {"translated": 0, "skipped": 0, "errors": 1}
+    
+    try:
+        if dry_run:
+            for para, trans_text in zip(paragraphs, translations):
                 print(f"\n[Paragraph {para.paragraph_number}]")
                 print(f"Original: {para.text[:100]}...")
                 print(f"Translated: {trans_text[:100]}...")
-            else:
-                # Check if translation already exists
-                existing = session.query(Translation).filter(
-                    Translation.paragraph_id == para.id,
-                    Translation.prompt_name == service.prompt_name
-                ).first()
-                
-                if existing:
-                    # Update existing translation
-                    existing.translated_text = trans_text
-                    existing.model = service.model
-                    existing.created_at = datetime.now()
-                else:
-                    # Create new translation
-                    translation = Translation(
-                        paragraph_id=para.id,
-                        prompt_name=service.prompt_name,
-                        translated_text=trans_text,
-                        model=service.model
-                    )
-                    session.add(translation)
-                
-                saved += 1
-        
-        if not dry_run:
+        else:
+            # Save to database
+            saved = save_translations(session, paragraphs, translations, service.prompt_name, service.model)
             session.commit()
             print(f"✓ Saved {saved} translations to database")
         
@@ -276,8 +1361,101 @@ def translate_section_to_db(
         return {"translated": 0, "skipped": 0, "errors": 1}
 
 
+async def translate_sections_to_db(
+    session: Session,
+    service: TranslationService,
+    sections: List[Section],
+    max_concurrent_requests: Optional[int] = None,
+    dry_run: bool = False
+) -> Dict[str, any]:
+    """
+    Translate several sections concurrently and save them to the database.
+    
+    The API requests overlap (up to max_concurrent_requests at a time), and each
+    section is saved as soon as its translations arrive; the database work
+    stays on this thread.
+    
+    Args:
+        session: Database session
+        service: TranslationService instance
+        sections: Sections to translate
+        max_concurrent_requests: Maximum requests in flight at once
+        dry_run: If True, don't save to database
+    
+    Returns:
+        Dict with statistics (errors are counted per section, as in translate_section_to_db)
+    """
+    # All the sections' paragraphs in one query
+    paragraphs_by_section = {section.id: [] for section in sections}
+    for para in query_in_chunks(
+        session.query(Paragraph).order_by(Paragraph.section_id, Paragraph.paragraph_number),
+        Paragraph.section_id,
+        paragraphs_by_section
+    ):
+        paragraphs_by_section[para.section_id].append(para)
+    
+    work = [
+        (section, paragraphs_by_section[section.id])
+        for section in sections
+        if paragraphs_by_section[section.id]
+    ]
+    
+    print(f"\n{'='*80}")
+    print(f"Translating {len(work)} sections concurrently")
+    print(f"Paragraphs: {sum(len(paragraphs) for _, paragraphs in work)}")
+    print(f"Prompt: {service.prompt_name}")
+    print(f"{'='*80}")
+    
+    stats = {"translated": 0, "skipped": 0, "errors": 0}
+    
+    def save_section(index, result):
+        """Save a section's translations (called as each section finishes)."""
+        section, paragraphs = work[index]
+        if isinstance(result, Exception):
+            print(f"✗ Error translating section {section.section_number}: {result}")
+            stats["errors"] += 1
+            return
+        
+        if not dry_run:
+            try:
+                save_translations(session, paragraphs, result, service.prompt_name, service.model)
+                session.commit()
+            except Exception as e:
+                print(f"✗ Error saving section {section.section_number}: {e}")
+                session.rollback()
+                stats["errors"] += 1
+                return
+        
+        print(f"✓ Section {section.section_number}: {len(result)} paragraphs")
+        stats["translated"] += len(result)
+    
+    await service.translate_all(
+        [paragraphs for _, paragraphs in work],
+        max_concurrent_requests,
+        on_section_done=save_section
+    )
+    
+    return stats
+
+
 def main():
     """Main function - translate a test section."""
+    parser = argparse.ArgumentParser(
+        description='Translate a test section (or all sections of a chapter concurrently)'
+    )
+    parser.add_argument(
+        '--all-sections',
+        action='store_true',
+        help='Translate every section of the test chapter concurrently'
+    )
+    parser.add_argument(
+        '--max-concurrent',
+        type=int,
+        help='Maximum concurrent API requests with --all-sections (default: from config)'
+    )
+    args = parser.parse_args()
+    configure_logging()
+    
     print("Starting translation process...")
     
     # Initialize database
@@ -286,7 +1464,7 @@ def main():
     
     try:
         # Initialize translation service
-        service = TranslationService(prompt_name="modern")
+        service = TranslationService(prompt_name="modern", cache_session=session)
         
         # Find the test section: Chapter 6, Section 1 (8 paragraphs)
         # "שער חמישי - שער ייחוד המעשה → הקדמה"
@@ -298,6 +1476,25 @@ def main():
             print("Error: Could not find chapter 6")
             return
         
+        if args.all_sections:
+            sections = session.query(Section).filter(
+                Section.chapter_id == chapter.id
+            ).order_by(Section.section_number).all()
+            
+            stats = asyncio.run(translate_sections_to_db(
+                session=session,
+                service=service,
+                sections=sections,
+                max_concurrent_requests=args.max_concurrent
+            ))
+            
+            print(f"\n{'='*80}")
+            print("Translation Summary")
+            print(f"{'='*80}")
+            print(f"Translated: {stats['translated']}")
+            print(f"Errors: {stats['errors']}")
+            return
+        
         section = session.query(Section).filter(
             Section.chapter_id == chapter.id,
             Section.section_number == 1
@@ -332,9 +1529,9 @@ def main():
         if stats['translated'] > 0:
             print(f"\n✓ Successfully translated {stats['translated']} paragraphs!")
             print(f"  Run 'python -m tests.verify_translations' to review results")
-        
+    
     finally:
-        session.close()
+        SessionLocal.remove()
 
 
 if __name__ == "__main__":
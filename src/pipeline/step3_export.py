@@ -9,18 +9,208 @@ This script creates Word documents with translations in a table format:
 Supports exporting individual sections, chapters, or the entire book.
 """
 
-from typing import Optional, List
+from collections import namedtuple
+from copy import deepcopy
+from functools import lru_cache
+from io import BytesIO
+from itertools import groupby
+from operator import attrgetter
+from typing import Optional, List, Iterable
 from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZipFile
 from docx import Document
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
+from docx.opc.oxml import serialize_part_xml
+from docx.shared import Emu, Inches, Pt
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml.ns import nsmap, qn
 from docx.oxml import OxmlElement
+from docx.oxml.parser import oxml_parser
+from lxml import etree
+from sqlalchemy import and_
+from sqlalchemy.orm import selectinload
 
 from src.models import init_db, Chapter, Section, Paragraph, Translation
 from src.utils import config
 
 
+# Translation table for RTL punctuation: parentheses and brackets are mirrored
+_RTL_FIXES = str.maketrans({
+    '(': ')',
+    ')': '(',
+    '[': ']',
+    ']': '[',
+    '{': '}',
+    '}': '{',
+    '<': '>',
+    '>': '<'
+})
+# The characters _RTL_FIXES changes
+_RTL_CHARS = frozenset('()[]{}<>')
+# Joins texts fixed in one pass by _fix_rtl_texts (NUL cannot occur in document text)
+_RTL_BATCH_SEPARATOR = '\x00'
+
+# Name of the paragraph style of original and translated text in tables
+TABLE_TEXT_STYLE = 'Table Text'
+
+# Tags of the elements built for every paragraph. Making them from these
+# (with oxml_parser.makeelement or etree.SubElement) skips OxmlElement's parsing
+# of the prefixed tag on each call; they are still python-docx's element classes.
+_W_NSMAP = {'w': nsmap['w']}
+_W_P = qn('w:p')
+_W_R = qn('w:r')
+_W_TC = qn('w:tc')
+_W_TR = qn('w:tr')
+_SECTPR_TAG = qn('w:sectPr')
+
+
+@lru_cache(maxsize=8192)
+def _fix_rtl_text_cached(text: str) -> str:
+    """Memoized body of DocumentExporter._fix_rtl_text (titles and headers repeat throughout a book)."""
+    return text.translate(_RTL_FIXES)
+
+
+# Property elements (<w:rPr>, <w:pPr>, <w:tcPr>) repeat with the same few
+# formattings in every row, so each formatting is built once and deep-copied
+# (a copy in lxml is much cheaper than building the elements one by one).
+# The cached elements are prototypes and must not be changed.
+
+@lru_cache(maxsize=None)
+def _run_properties(
+    size: Optional[float],
+    bold: bool,
+    italic: bool,
+    color: Optional[str],
+    superscript: bool,
+    font: Optional[str]
+):
+    """The <w:rPr> of a run made by DocumentExporter._make_run (None if it has no formatting)."""
+    rPr = OxmlElement('w:rPr')
+    
+    # Children must follow the schema order: rFonts, b, i, color, sz, vertAlign
+    if font:
+        rFonts = OxmlElement('w:rFonts')
+        rFonts.set(qn('w:ascii'), font)
+        rFonts.set(qn('w:hAnsi'), font)
+        rPr.append(rFonts)
+    if bold:
+        rPr.append(OxmlElement('w:b'))
+    if italic:
+        rPr.append(OxmlElement('w:i'))
+    if color:
+        color_elm = OxmlElement('w:color')
+        color_elm.set(qn('w:val'), color)
+        rPr.append(color_elm)
+    if size is not None:
+        sz = OxmlElement('w:sz')
+        sz.set(qn('w:val'), str(int(size * 2)))  # Half-points
+        rPr.append(sz)
+    if superscript:
+        vert_align = OxmlElement('w:vertAlign')
+        vert_align.set(qn('w:val'), 'superscript')
+        rPr.append(vert_align)
+    return rPr if len(rPr) else None
+
+
+@lru_cache(maxsize=None)
+def _rtl_paragraph_properties(style: Optional[str], space_after: Optional[float], bidi: bool):
+    """The <w:pPr> of a paragraph made by DocumentExporter._make_rtl_para."""
+    pPr = OxmlElement('w:pPr')
+    if style:
+        pStyle = OxmlElement('w:pStyle')
+        pStyle.set(qn('w:val'), style)
+        pPr.append(pStyle)
+    if bidi:
+        pPr.append(OxmlElement('w:bidi'))
+    if space_after is not None:
+        spacing = OxmlElement('w:spacing')
+        spacing.set(qn('w:after'), str(int(space_after * 20)))  # Twips
+        pPr.append(spacing)
+    return pPr
+
+
+@lru_cache(maxsize=None)
+def _centered_paragraph_properties(bidi: bool):
+    """The <w:pPr> of a paragraph made by DocumentExporter._make_centered_para."""
+    pPr = OxmlElement('w:pPr')
+    jc = OxmlElement('w:jc')
+    jc.set(qn('w:val'), 'center')
+    pPr.append(jc)
+    if bidi:
+        pPr.append(OxmlElement('w:bidi'))
+    return pPr
+
+
+@lru_cache(maxsize=None)
+def _cell_properties(width: int, fill: Optional[str]):
+    """The <w:tcPr> of a cell made by DocumentExporter._make_cell."""
+    tcPr = OxmlElement('w:tcPr')
+    tcW = OxmlElement('w:tcW')
+    tcW.set(qn('w:type'), 'dxa')
+    tcW.set(qn('w:w'), str(width))
+    tcPr.append(tcW)
+    if fill:
+        shd = OxmlElement('w:shd')
+        shd.set(qn('w:fill'), fill)
+        tcPr.append(shd)
+    return tcPr
+
+
+def chapter_tree_options(prompt_name: str) -> list:
+    """
+    Loader options that fetch a chapter's sections, paragraphs and translations up front.
+    
+    Only translations for the given prompt are loaded, so walking the tree in
+    DocumentExporter.export_chapter doesn't issue any further queries.
+    
+    Args:
+        prompt_name: Name of the translation prompt being exported
+    
+    Returns:
+        List of options to pass to session.query(Chapter).options(...)
+    """
+    translations = Paragraph.translations.and_(Translation.prompt_name == prompt_name)
+    return [
+        selectinload(Chapter.sections)
+            .selectinload(Section.paragraphs)
+            .selectinload(translations),
+        selectinload(Chapter.paragraphs)
+            .selectinload(translations),
+    ]
+
+
+# A flattened paragraph row, as read from export_book's export_rows table
+ExportRow = namedtuple('ExportRow', [
+    'chapter_number', 'chapter_title', 'section_number', 'section_title',
+    'paragraph_number', 'original', 'translation'
+])
+
+
+@lru_cache(maxsize=None)
+def _chapter_exporter(prompt_name: str, show_original: bool) -> 'DocumentExporter':
+    """The exporter render_chapter_xml renders with (one per process for each set of options)."""
+    return DocumentExporter(show_original=show_original, prompt_name=prompt_name)
+
+
+def render_chapter_xml(chapter_title: str, rows: List[ExportRow], prompt_name: str, show_original: bool) -> bytes:
+    """
+    Render a chapter and return its body elements as XML.
+    
+    Used to render chapters one at a time (possibly in worker processes); the
+    results are written into the final document with DocumentExporter.save_streamed.
+    
+    Args:
+        chapter_title: Chapter title for the heading
+        rows: The chapter's rows (see DocumentExporter.export_chapter_rows)
+        prompt_name: Name of the translation prompt being exported
+        show_original: Whether to show original text alongside translation
+    
+    Returns:
+        The chapter's serialized <w:p>/<w:tbl> elements, in document order (see
+        DocumentExporter.render_chapter_rows)
+    """
+    return _chapter_exporter(prompt_name, show_original).render_chapter_rows(chapter_title, rows)
+
+
 class DocumentExporter:
     """Service for exporting translations to DOCX format."""
     
@@ -44,6 +234,36 @@ class DocumentExporter:
         font = style.font
         font.name = 'David'  # Hebrew font
         font.size = Pt(12)
+        
+        # Style for the text in paragraph table rows, so their paragraphs and runs
+        # need no formatting of their own (RTL included)
+        table_text = self.doc.styles.add_style(TABLE_TEXT_STYLE, WD_STYLE_TYPE.PARAGRAPH)
+        table_text.base_style = style
+        table_text.font.name = 'David'
+        table_text.font.size = Pt(11)
+        table_text.element.get_or_add_pPr().append(OxmlElement('w:bidi'))
+        self._table_text_style_id = table_text.style_id
+        self._table_style_id = self.doc.styles['Light Grid Accent 1'].style_id
+        
+        # The layout is decided once: a table of number, original and translation,
+        # or the translation alone as flowing text
+        if show_original:
+            self._add_paragraphs = self._add_paragraph_table
+        else:
+            self._add_paragraphs = self._add_flowing_paragraphs
+        
+        # Table column widths in twips: Number | Original | Translation
+        self._column_widths = [Inches(0.4).twips, Inches(3.0).twips, Inches(3.0).twips]
+        
+        # Header cells are as wide as doc.add_table() makes them: the space between
+        # the margins, split evenly
+        section = self.doc.sections[-1]
+        block_width = section.page_width - section.left_margin - section.right_margin
+        self._header_cell_width = Emu(block_width // len(self._column_widths)).twips
+        
+        # Where content is added: the document's body, or the detached body
+        # render_chapter_rows renders into
+        self._body = self.doc.element.body
     
     def _set_document_rtl(self):
         """Set the document to RTL (right-to-left) mode for Hebrew."""
@@ -62,169 +282,250 @@ class DocumentExporter:
         
         Args:
             text: Text to fix
-            
+        
         Returns:
             Text with reversed parentheses and brackets
         """
-        if not text:
+        # Most paragraphs have no brackets at all; those need no new string (or cache entry)
+        if not text or _RTL_CHARS.isdisjoint(text):
             return text
         
-        # Create translation table for RTL punctuation
-        rtl_fixes = str.maketrans({
-            '(': ')',
-            ')': '(',
-            '[': ']',
-            ']': '[',
-            '{': '}',
-            '}': '{',
-            '<': '>',
-            '>': '<'
-        })
-        
-        return text.translate(rtl_fixes)
-    
-    def _set_paragraph_rtl(self, paragraph):
-        """Set a paragraph to RTL (right-to-left) mode."""
-        pPr = paragraph._element.get_or_add_pPr()
-        bidi = pPr.find(qn('w:bidi'))
-        if bidi is None:
-            bidi = OxmlElement('w:bidi')
-            pPr.append(bidi)
-    
-    def _add_chapter_heading(self, chapter: Chapter):
+        return _fix_rtl_text_cached(text)
+    
+    def _fix_rtl_texts(self, texts: List[Optional[str]]) -> List[Optional[str]]:
+        """
+        Fix parentheses and brackets for RTL display in many texts at once.
+        
+        The texts are joined and translated in a single pass, which is cheaper
+        than a _fix_rtl_text call per paragraph. The texts are not memoized.
+        
+        Args:
+            texts: Texts to fix; None entries are returned as None
+        
+        Returns:
+            The fixed texts, in the same order
+        """
+        joined = _RTL_BATCH_SEPARATOR.join(text or '' for text in texts)
+        if _RTL_CHARS.isdisjoint(joined):
+            return list(texts)
+        
+        fixed = joined.translate(_RTL_FIXES).split(_RTL_BATCH_SEPARATOR)
+        return [None if text is None else fixed_text for text, fixed_text in zip(texts, fixed)]
+    
+    def _make_run(
+        self,
+        text: str,
+        size: Optional[float],
+        bold: bool = False,
+        italic: bool = False,
+        color: Optional[str] = None,
+        superscript: bool = False,
+        font: Optional[str] = 'David'
+    ):
+        """
+        Build a <w:r> element directly, without going through python-docx's run API.
+        
+        Args:
+            text: Run text
+            size: Font size in points, or None for the default
+            bold: Bold text
+            italic: Italic text
+            color: Hex RGB color (e.g. '808080'), or None for the default
+            superscript: Raise the run as superscript
+            font: Font name, or None for the default
+        
+        Returns:
+            The <w:r> element
+        """
+        run = oxml_parser.makeelement(_W_R, nsmap=_W_NSMAP)
+        rPr = _run_properties(size, bold, italic, color, superscript, font)
+        if rPr is not None:
+            run.append(deepcopy(rPr))
+        
+        # CT_R's text setter splits line breaks and tabs into <w:br/>/<w:tab/> like add_run does
+        run.text = text
+        return run
+    
+    def _make_rtl_para(
+        self,
+        *runs,
+        style: Optional[str] = None,
+        space_after: Optional[float] = None,
+        bidi: bool = True
+    ):
+        """
+        Build an RTL <w:p> element from runs made by _make_run.
+        
+        Args:
+            runs: <w:r> elements to put in the paragraph
+            style: Paragraph style ID (e.g. 'Heading1'), or None for Normal
+            space_after: Spacing after the paragraph in points, or None for the default
+            bidi: Add <w:bidi/> (False when the style already makes the paragraph RTL)
+        
+        Returns:
+            The <w:p> element
+        """
+        para = oxml_parser.makeelement(_W_P, nsmap=_W_NSMAP)
+        para.append(deepcopy(_rtl_paragraph_properties(style, space_after, bidi)))
+        para.extend(runs)
+        return para
+    
+    def _append_element(self, element):
+        """Append a block element (<w:p>, <w:tbl>) to the end of the document body."""
+        # The section properties, if any, are the body's last child. Look only
+        # there: body._insert_p()/_insert_tbl() search all of the body's children
+        # for them, making a chapter's appends quadratic in its length
+        body = self._body
+        if len(body) and body[-1].tag == _SECTPR_TAG:
+            body[-1].addprevious(element)
+        else:
+            body.append(element)
+    
+    def _get_translation(self, para: Paragraph) -> Optional[Translation]:
+        """Get the paragraph's translation for this exporter's prompt (if any)."""
+        for translation in para.translations:
+            if translation.prompt_name == self.prompt_name:
+                return translation
+        return None
+    
+    def _add_chapter_heading(self, title: str):
         """Add a chapter heading to the document."""
-        heading = self.doc.add_heading(level=1)
-        run = heading.add_run(self._fix_rtl_text(chapter.title))
-        run.font.name = 'David'
-        run.font.size = Pt(18)
-        run.font.bold = True
-        run.font.color.rgb = RGBColor(0, 51, 102)  # Dark blue
-        # Set RTL for Hebrew text
-        self._set_paragraph_rtl(heading)
-    
-    def _add_section_heading(self, section: Section):
+        run = self._make_run(self._fix_rtl_text(title), size=18, bold=True, color='003366')  # Dark blue
+        self._append_element(self._make_rtl_para(run, style='Heading1'))
+    
+    def _add_section_heading(self, title: str):
         """Add a section heading to the document."""
-        heading = self.doc.add_heading(level=2)
-        run = heading.add_run(self._fix_rtl_text(section.title))
-        run.font.name = 'David'
-        run.font.size = Pt(14)
-        run.font.bold = True
-        run.font.color.rgb = RGBColor(51, 102, 153)  # Medium blue
-        # Set RTL for Hebrew text
-        self._set_paragraph_rtl(heading)
+        run = self._make_run(self._fix_rtl_text(title), size=14, bold=True, color='336699')  # Medium blue
+        self._append_element(self._make_rtl_para(run, style='Heading2'))
     
     def _create_table_header(self):
-        """Create table with header row."""
-        if self.show_original:
-            # 3 columns: Number | Original | Translation
-            table = self.doc.add_table(rows=1, cols=3)
-            table.style = 'Light Grid Accent 1'
-            
-            # Set column widths
-            table.columns[0].width = Inches(0.4)  # Narrow for numbers
-            table.columns[1].width = Inches(3.0)  # Original text
-            table.columns[2].width = Inches(3.0)  # Translation
-            
-            # Header row
-            header_cells = table.rows[0].cells
-            header_cells[0].text = '#'
-            header_cells[1].text = self._fix_rtl_text('תרגום מקורי')
-            header_cells[2].text = self._fix_rtl_text('עברית מודרנית')
-            
-            # Format header
-            for cell in header_cells:
-                para = cell.paragraphs[0]
-                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                self._set_paragraph_rtl(para)  # Set RTL
-                for run in para.runs:
-                    run.font.bold = True
-                    run.font.size = Pt(11)
-                    run.font.name = 'David'
-                # Shade header
-                shading_elm = OxmlElement('w:shd')
-                shading_elm.set(qn('w:fill'), 'D9E2F3')  # Light blue
-                cell._element.get_or_add_tcPr().append(shading_elm)
-        else:
-            # 2 columns: Number | Translation
-            table = self.doc.add_table(rows=1, cols=2)
-            table.style = 'Light Grid Accent 1'
-            
-            # Set column widths
-            table.columns[0].width = Inches(0.4)  # Narrow for numbers
-            table.columns[1].width = Inches(6.0)  # Translation
-            
-            # Header row
-            header_cells = table.rows[0].cells
-            header_cells[0].text = '#'
-            header_cells[1].text = self._fix_rtl_text('תרגום (עברית מודרנית)')
-            
-            # Format header
-            for cell in header_cells:
-                para = cell.paragraphs[0]
-                para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                self._set_paragraph_rtl(para)  # Set RTL
-                for run in para.runs:
-                    run.font.bold = True
-                    run.font.size = Pt(11)
-                    run.font.name = 'David'
-                # Shade header
-                shading_elm = OxmlElement('w:shd')
-                shading_elm.set(qn('w:fill'), 'D9E2F3')  # Light blue
-                cell._element.get_or_add_tcPr().append(shading_elm)
+        """
+        Add a table with just its header row.
+        
+        The table is built directly, without python-docx's table API, the way
+        doc.add_table() and formatting the header cells would build it.
+        
+        Returns:
+            The <w:tbl> element
+        """
+        # 3 columns: Number | Original | Translation
+        headers = ['#', self._fix_rtl_text('תרגום מקורי'), self._fix_rtl_text('עברית מודרנית')]
+        
+        table = OxmlElement('w:tbl')
+        tblPr = OxmlElement('w:tblPr')
+        tblStyle = OxmlElement('w:tblStyle')
+        tblStyle.set(qn('w:val'), self._table_style_id)
+        tblPr.append(tblStyle)
+        tblW = OxmlElement('w:tblW')
+        tblW.set(qn('w:type'), 'auto')
+        tblW.set(qn('w:w'), '0')
+        tblPr.append(tblW)
+        tblLook = OxmlElement('w:tblLook')
+        for name, value in [('firstColumn', '1'), ('firstRow', '1'), ('lastColumn', '0'),
+                            ('lastRow', '0'), ('noHBand', '0'), ('noVBand', '1'), ('val', '04A0')]:
+            tblLook.set(qn(f'w:{name}'), value)
+        tblPr.append(tblLook)
+        table.append(tblPr)
         
+        tblGrid = OxmlElement('w:tblGrid')
+        for width in self._column_widths:
+            gridCol = OxmlElement('w:gridCol')
+            gridCol.set(qn('w:w'), str(width))
+            tblGrid.append(gridCol)
+        table.append(tblGrid)
+        
+        # Header row: bold, centered and shaded light blue
+        row = etree.SubElement(table, _W_TR)
+        for text in headers:
+            para = self._make_centered_para(self._make_run(text, size=11, bold=True), bidi=True)
+            self._add_cell(row, self._header_cell_width, para, fill='D9E2F3')
+        
+        self._append_element(table)
         return table
     
-    def _add_paragraph_row(self, table, para: Paragraph, translation: Translation):
-        """Add a row to the table with paragraph data (used only when show_original=True)."""
-        row = table.add_row()
-        cells = row.cells
-        
-        # Paragraph number
-        cells[0].text = str(para.paragraph_number)
-        num_para = cells[0].paragraphs[0]
-        num_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        for run in num_para.runs:
-            run.font.size = Pt(10)
-            run.font.color.rgb = RGBColor(128, 128, 128)  # Gray
-        
-        # Original text
-        cells[1].text = self._fix_rtl_text(para.text)
-        orig_para = cells[1].paragraphs[0]
-        self._set_paragraph_rtl(orig_para)  # Set RTL
-        for run in orig_para.runs:
-            run.font.name = 'David'
-            run.font.size = Pt(11)
-        
-        # Translation
-        cells[2].text = self._fix_rtl_text(translation.translated_text)
-        trans_para = cells[2].paragraphs[0]
-        self._set_paragraph_rtl(trans_para)  # Set RTL
-        for run in trans_para.runs:
-            run.font.name = 'David'
-            run.font.size = Pt(11)
-    
-    def _add_flowing_paragraph(self, para: Paragraph, translation: Translation):
-        """Add a paragraph as flowing text without table (used when show_original=False)."""
-        # Create a single paragraph with superscript number at the beginning
-        text_para = self.doc.add_paragraph()
-        
-        # Add paragraph number in superscript at the beginning
-        num_run = text_para.add_run(f"[{para.paragraph_number}] ")
-        num_run.font.superscript = True
-        num_run.font.size = Pt(9)
-        num_run.font.color.rgb = RGBColor(128, 128, 128)  # Gray
-        num_run.font.name = 'David'
-        
-        # Add the translation text
-        text_run = text_para.add_run(self._fix_rtl_text(translation.translated_text))
-        text_run.font.name = 'David'
-        text_run.font.size = Pt(12)
-        
-        # Set RTL for the paragraph
-        self._set_paragraph_rtl(text_para)
-        
-        # Add spacing after paragraph
-        text_para.paragraph_format.space_after = Pt(6)
+    def _make_centered_para(self, run, bidi: bool = False):
+        """Build a centered <w:p> element holding a run made by _make_run (RTL if bidi)."""
+        para = oxml_parser.makeelement(_W_P, nsmap=_W_NSMAP)
+        para.append(deepcopy(_centered_paragraph_properties(bidi)))
+        para.append(run)
+        return para
+    
+    def _add_cell(self, row, width: int, para, fill: Optional[str] = None):
+        """
+        Add a table cell (<w:tc>) holding a paragraph to the end of a row.
+        
+        Args:
+            row: The <w:tr> element
+            width: Cell width in twips
+            para: The cell's <w:p> element
+            fill: Hex RGB shading color, or None for no shading
+        """
+        cell = etree.SubElement(row, _W_TC)
+        cell.append(deepcopy(_cell_properties(width, fill)))
+        cell.append(para)
+    
+    def _build_row_xml(self, paragraph_number: int, original: str, translated_text: Optional[str]):
+        """
+        Build a table row (<w:tr>) for a paragraph, without going through python-docx's table API.
+        
+        Adding rows with table.add_row() and filling cells through cell.text and
+        runs costs python-docx bookkeeping per cell; callers build all of a
+        table's rows and append them at once with tbl.extend().
+        
+        Args:
+            paragraph_number: Paragraph number for the first column
+            original: Original text (already RTL-fixed)
+            translated_text: Translated text (already RTL-fixed), or None for an
+                             untranslated paragraph
+        
+        Returns:
+            The <w:tr> element
+        """
+        # Paragraph number, centered
+        if translated_text is not None:
+            num_run = self._make_run(str(paragraph_number), size=10, color='808080', font=None)  # Gray
+        else:
+            num_run = self._make_run(str(paragraph_number), size=None, font=None)
+        num_para = self._make_centered_para(num_run)
+        
+        # The text's direction, font and size come from the Table Text style
+        orig_run = self._make_run(original, size=None, font=None)
+        if translated_text is not None:
+            trans_run = self._make_run(translated_text, size=None, font=None)
+        else:
+            # No translation yet
+            trans_run = self._make_run(
+                self._fix_rtl_text("(טרם תורגם)"), size=None, italic=True, color='808080', font=None
+            )
+        paras = [
+            num_para,
+            self._make_rtl_para(orig_run, style=self._table_text_style_id, bidi=False),
+            self._make_rtl_para(trans_run, style=self._table_text_style_id, bidi=False)
+        ]
+        
+        # Each cell has its column's width, as table.add_row() would give it
+        row = oxml_parser.makeelement(_W_TR, nsmap=_W_NSMAP)
+        for width, para in zip(self._column_widths, paras):
+            self._add_cell(row, width, para)
+        return row
+    
+    def _add_flowing_text(self, paragraph_number: int, text: str, placeholder: bool = False):
+        """
+        Add a flowing RTL paragraph with its number in superscript at the beginning.
+        
+        Args:
+            paragraph_number: Number shown before the text
+            text: Paragraph text (already RTL-fixed)
+            placeholder: Show the text as a grey italic placeholder
+        """
+        num_run = self._make_run(f"[{paragraph_number}] ", size=9, color='808080', superscript=True)  # Gray
+        if placeholder:
+            text_run = self._make_run(text, size=12, italic=True, color='808080')
+        else:
+            text_run = self._make_run(text, size=12)
+        
+        # Spacing after paragraph
+        self._append_element(self._make_rtl_para(num_run, text_run, space_after=6))
     
     def export_section(self, session, section: Section, include_heading: bool = True):
         """
@@ -236,183 +537,267 @@ class DocumentExporter:
             include_heading: Whether to include chapter/section headings
         """
         if include_heading:
-            self._add_chapter_heading(section.chapter)
-            self._add_section_heading(section)
+            self._add_chapter_heading(section.chapter.title)
+            self._add_section_heading(section.title)
         
-        # Get paragraphs and their translations
-        paragraphs = session.query(Paragraph).filter(
+        # Get paragraphs and their translations (for this prompt only) in one query,
+        # as (number, original text, translated text or None) rows rather than ORM
+        # objects (_add_paragraphs takes the whole list, e.g. to fix RTL text in one pass)
+        entries = session.query(
+            Paragraph.paragraph_number, Paragraph.text, Translation.translated_text
+        ).outerjoin(
+            Translation,
+            and_(Translation.paragraph_id == Paragraph.id, Translation.prompt_name == self.prompt_name)
+        ).filter(
             Paragraph.section_id == section.id
         ).order_by(Paragraph.paragraph_number).all()
         
-        if not paragraphs:
-            empty_para = self.doc.add_paragraph(self._fix_rtl_text("(אין פסקאות בסעיף זה)"))
-            self._set_paragraph_rtl(empty_para)
+        if not entries:
+            empty_run = self._make_run(self._fix_rtl_text("(אין פסקאות בסעיף זה)"), size=None, font=None)
+            self._append_element(self._make_rtl_para(empty_run))
             return
         
-        if self.show_original:
-            # Table format with original text
-            table = self._create_table_header()
-            
-            # Add rows
-            for para in paragraphs:
-                # Get translation
-                translation = session.query(Translation).filter(
-                    Translation.paragraph_id == para.id,
-                    Translation.prompt_name == self.prompt_name
-                ).first()
-                
-                if translation:
-                    self._add_paragraph_row(table, para, translation)
-                else:
-                    # No translation yet
-                    row = table.add_row()
-                    cells = row.cells
-                    cells[0].text = str(para.paragraph_number)
-                    cells[0].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    
-                    cells[1].text = self._fix_rtl_text(para.text)
-                    orig_para = cells[1].paragraphs[0]
-                    self._set_paragraph_rtl(orig_para)
-                    for run in orig_para.runs:
-                        run.font.name = 'David'
-                    
-                    cells[2].text = self._fix_rtl_text("(טרם תורגם)")
-                    untrans_para = cells[2].paragraphs[0]
-                    self._set_paragraph_rtl(untrans_para)
-                    for run in untrans_para.runs:
-                        run.font.italic = True
-                        run.font.color.rgb = RGBColor(128, 128, 128)
-                        run.font.name = 'David'
-            
-            # Add spacing after table
-            self.doc.add_paragraph()
-        else:
-            # Flowing text format (translation only)
-            for para in paragraphs:
-                # Get translation
-                translation = session.query(Translation).filter(
-                    Translation.paragraph_id == para.id,
-                    Translation.prompt_name == self.prompt_name
-                ).first()
-                
-                if translation:
-                    self._add_flowing_paragraph(para, translation)
-                else:
-                    # No translation yet - show placeholder as simple paragraph
-                    text_para = self.doc.add_paragraph()
-                    
-                    # Add paragraph number in superscript at the beginning
-                    num_run = text_para.add_run(f"[{para.paragraph_number}] ")
-                    num_run.font.superscript = True
-                    num_run.font.size = Pt(9)
-                    num_run.font.color.rgb = RGBColor(128, 128, 128)
-                    num_run.font.name = 'David'
-                    
-                    # Add placeholder text
-                    text_run = text_para.add_run(self._fix_rtl_text("(טרם תורגם)"))
-                    text_run.font.name = 'David'
-                    text_run.font.size = Pt(12)
-                    text_run.font.italic = True
-                    text_run.font.color.rgb = RGBColor(128, 128, 128)
-                    
-                    # Set RTL for the paragraph
-                    self._set_paragraph_rtl(text_para)
-                    
-                    # Add spacing after paragraph
-                    text_para.paragraph_format.space_after = Pt(6)
-            
-            # Add spacing after section
-            self.doc.add_paragraph()
+        # Untranslated paragraphs get a placeholder
+        self._add_paragraphs(entries)
+        
+        # Add spacing after section
+        self._append_element(OxmlElement('w:p'))
     
     def export_chapter(self, session, chapter: Chapter):
         """
         Export an entire chapter (all sections) to the document.
         
+        The chapter's sections, paragraphs and translations are read through its
+        relationships; load the chapter with chapter_tree_options() to fetch them
+        all up front.
+        
         Args:
             session: Database session
             chapter: Chapter to export
         """
-        self._add_chapter_heading(chapter)
+        self._add_chapter_heading(chapter.title)
         
         # Check if chapter has sections
-        sections = session.query(Section).filter(
-            Section.chapter_id == chapter.id
-        ).order_by(Section.section_number).all()
+        sections = chapter.sections
         
         if sections:
             # Chapter has sections
             for section in sections:
-                self._add_section_heading(section)
+                self._add_section_heading(section.title)
                 
                 # Export section content (without headings since we just added them)
-                paragraphs = session.query(Paragraph).filter(
-                    Paragraph.section_id == section.id
-                ).order_by(Paragraph.paragraph_number).all()
-                
-                if paragraphs:
-                    if self.show_original:
-                        # Table format
-                        table = self._create_table_header()
-                        for para in paragraphs:
-                            translation = session.query(Translation).filter(
-                                Translation.paragraph_id == para.id,
-                                Translation.prompt_name == self.prompt_name
-                            ).first()
-                            
-                            if translation:
-                                self._add_paragraph_row(table, para, translation)
-                        
-                        self.doc.add_paragraph()
-                    else:
-                        # Flowing text format
-                        for para in paragraphs:
-                            translation = session.query(Translation).filter(
-                                Translation.paragraph_id == para.id,
-                                Translation.prompt_name == self.prompt_name
-                            ).first()
-                            
-                            if translation:
-                                self._add_flowing_paragraph(para, translation)
-                        
-                        self.doc.add_paragraph()
+                self._add_chapter_paragraphs(self._paragraph_entries(section.paragraphs))
         else:
             # Chapter has no sections - direct paragraphs
-            paragraphs = session.query(Paragraph).filter(
-                Paragraph.chapter_id == chapter.id,
-                Paragraph.section_id == None
-            ).order_by(Paragraph.paragraph_number).all()
+            paragraphs = [p for p in chapter.paragraphs if p.section_id is None]
+            self._add_chapter_paragraphs(self._paragraph_entries(paragraphs))
+    
+    def export_chapter_rows(self, chapter_title: str, rows: Iterable):
+        """
+        Export a chapter from flat, pre-joined rows instead of ORM objects.
+        
+        Produces the same output as export_chapter. Each row has section_number,
+        section_title, paragraph_number, original and translation attributes (see
+        export_book.create_export_rows) and the rows must be ordered by section and
+        paragraph number. Sectionless chapters have section_number None, and sections
+        without paragraphs have a single row with paragraph_number None.
+        
+        Args:
+            chapter_title: Chapter title for the heading
+            rows: The chapter's rows
+        """
+        self._add_chapter_heading(chapter_title)
+        
+        for section_number, section_rows in groupby(rows, key=attrgetter('section_number')):
+            section_rows = list(section_rows)
+            if section_number is not None:
+                self._add_section_heading(section_rows[0].section_title)
             
-            if paragraphs:
-                if self.show_original:
-                    # Table format
-                    table = self._create_table_header()
-                    for para in paragraphs:
-                        translation = session.query(Translation).filter(
-                            Translation.paragraph_id == para.id,
-                            Translation.prompt_name == self.prompt_name
-                        ).first()
-                        
-                        if translation:
-                            self._add_paragraph_row(table, para, translation)
-                    
-                    self.doc.add_paragraph()
-                else:
-                    # Flowing text format
-                    for para in paragraphs:
-                        translation = session.query(Translation).filter(
-                            Translation.paragraph_id == para.id,
-                            Translation.prompt_name == self.prompt_name
-                        ).first()
-                        
-                        if translation:
-                            self._add_flowing_paragraph(para, translation)
-                    
-                    self.doc.add_paragraph()
+            self._add_chapter_paragraphs([
+                (row.paragraph_number, row.original, row.translation)
+                for row in section_rows
+                if row.paragraph_number is not None
+            ])
+    
+    def render_chapter_rows(self, chapter_title: str, rows: Iterable) -> bytes:
+        """
+        Export a chapter like export_chapter_rows, but into a body of its own, and return its XML.
+        
+        The document itself is left unchanged, so one exporter can render any
+        number of chapters without building a python-docx document for each.
+        
+        Args:
+            chapter_title: Chapter title for the heading
+            rows: The chapter's rows (see export_chapter_rows)
+        
+        Returns:
+            The chapter's serialized <w:p>/<w:tbl> elements, in document order. They
+            are serialized within the body, so they don't repeat the namespace
+            declarations, which the final document's root element provides.
+        """
+        body = OxmlElement('w:body')
+        self._body = body
+        try:
+            self.export_chapter_rows(chapter_title, rows)
+        finally:
+            self._body = self.doc.element.body
+        
+        if len(body) == 0:
+            return b''
+        xml = etree.tostring(body, encoding='UTF-8')
+        return xml[xml.index(b'>') + 1:-len(b'</w:body>')]
+    
+    def _paragraph_entries(self, paragraphs: List[Paragraph]) -> list:
+        """Turn paragraphs into (number, original text, translated text or None) entries."""
+        entries = []
+        for para in paragraphs:
+            translation = self._get_translation(para)
+            entries.append((
+                para.paragraph_number,
+                para.text,
+                translation.translated_text if translation else None
+            ))
+        return entries
+    
+    def _add_chapter_paragraphs(self, entries: list):
+        """
+        Add the translated paragraphs of a chapter or section (untranslated ones are left out).
+        
+        Args:
+            entries: (paragraph number, original text, translated text or None) tuples
+        """
+        if not entries:
+            return
+        
+        # Untranslated paragraphs are left out
+        self._add_paragraphs([entry for entry in entries if entry[2] is not None])
+        self._append_element(OxmlElement('w:p'))
+    
+    def _add_paragraph_table(self, entries: list):
+        """
+        Add paragraphs as a table of number, original and translation (the show_original layout).
+        
+        Args:
+            entries: (paragraph number, original text, translated text or None)
+                     tuples; untranslated paragraphs get a placeholder
+        """
+        table = self._create_table_header()
+        
+        # Fix the RTL punctuation of all of the texts in one pass
+        originals = self._fix_rtl_texts([original for _, original, _ in entries])
+        translations = self._fix_rtl_texts([translated_text for _, _, translated_text in entries])
+        table.extend([
+            self._build_row_xml(paragraph_number, original, translated_text)
+            for (paragraph_number, _, _), original, translated_text in zip(entries, originals, translations)
+        ])
+    
+    def _add_flowing_paragraphs(self, entries: list):
+        """
+        Add paragraphs' translations as flowing text, without a table (the translation-only layout).
+        
+        Args:
+            entries: (paragraph number, original text, translated text or None)
+                     tuples; untranslated paragraphs get a placeholder
+        """
+        # Fix the RTL punctuation of all of the texts in one pass
+        translations = self._fix_rtl_texts([translated_text for _, _, translated_text in entries])
+        for (paragraph_number, _, _), translated_text in zip(entries, translations):
+            if translated_text is not None:
+                self._add_flowing_text(paragraph_number, translated_text)
+            else:
+                # No translation yet - show placeholder as simple paragraph
+                self._add_flowing_text(
+                    paragraph_number,
+                    self._fix_rtl_text("(טרם תורגם)"),
+                    placeholder=True
+                )
+    
+    def _make_page_break(self):
+        """Build a paragraph holding a page break, like Document.add_page_break() adds."""
+        br = OxmlElement('w:br')
+        br.set(qn('w:type'), 'page')
+        run = OxmlElement('w:r')
+        run.append(br)
+        para = OxmlElement('w:p')
+        para.append(run)
+        return para
     
     def save(self, filename: Path):
         """Save the document to a file."""
         self.doc.save(str(filename))
         print(f"✓ Document saved: {filename}")
+    
+    def save_streamed(self, filename: Path, fragments: Iterable[bytes]):
+        """
+        Save the document followed by more body elements, writing them as they come.
+        
+        The elements are written straight into the file's word/document.xml
+        after the document's own body, without being added to the document, so a
+        whole book never has to be in memory.
+        
+        Args:
+            filename: Path to save the document to
+            fragments: Serialized <w:p>/<w:tbl> elements, in document order (as
+                       returned by render_chapter_xml: namespace prefixes are those
+                       declared on this document's root element)
+        """
+        # The main document part, split where the fragments go (before the section properties)
+        body = self.doc.element.body
+        sectPr = body.find(qn('w:sectPr'))
+        marker = etree.Comment('fragments')
+        if sectPr is not None:
+            sectPr.addprevious(marker)
+        else:
+            body.append(marker)
+        try:
+            head, tail = serialize_part_xml(self.doc.element).split(b'<!--fragments-->')
+        finally:
+            body.remove(marker)
+        
+        # Save the rest of the package as usual, then copy it with the main part replaced
+        package = BytesIO()
+        self.doc.save(package)
+        with ZipFile(package) as source, ZipFile(str(filename), 'w', compression=ZIP_DEFLATED) as target:
+            for item in source.infolist():
+                if item.filename != 'word/document.xml':
+                    target.writestr(item, source.read(item.filename))
+                    continue
+                
+                with target.open(item.filename, 'w') as part:
+                    part.write(head)
+                    for fragment in fragments:
+                        part.write(fragment)
+                    part.write(tail)
+        
+        print(f"✓ Document saved: {filename}")
+
+
+def _build_output_path(
+    output_dir: Path,
+    args,
+    show_original: bool,
+    chapter_num: int,
+    section_num: Optional[int] = None
+) -> Path:
+    """
+    The file main() saves to: --output, or a name made from the exported content.
+    
+    Args:
+        output_dir: Directory to save in
+        args: Parsed command line arguments
+        show_original: Whether the original text is shown
+        chapter_num: Exported chapter number
+        section_num: Exported section number, or None for the entire chapter
+    
+    Returns:
+        Path of the output file
+    """
+    if args.output:
+        return output_dir / args.output
+    
+    content = f"chapter{chapter_num}" if section_num is None else f"ch{chapter_num}_sec{section_num}"
+    original_suffix = "_with_original" if show_original else "_only"
+    return output_dir / f"{content}_{args.prompt}{original_suffix}.docx"
 
 
 def main():
@@ -464,17 +849,21 @@ def main():
     session = SessionLocal()
     
     try:
-        # Find the chapter
+        # Find the chapter (with its whole tree when exporting all of it)
         chapter_num = args.chapter or 6
         
-        chapter = session.query(Chapter).filter(
-            Chapter.chapter_number == chapter_num
-        ).first()
+        query = session.query(Chapter)
+        if not args.section:
+            query = query.options(*chapter_tree_options(args.prompt))
+        chapter = query.filter(Chapter.chapter_number == chapter_num).first()
         
         if not chapter:
             print(f"Error: Could not find chapter {chapter_num}")
             return
         
+        # Determine if we should show original
+        show_original = args.show_original and not args.no_original
+        
         # Determine if we're exporting a section or entire chapter
         if args.section:
             # Export specific section
@@ -490,17 +879,7 @@ def main():
             print(f"Exporting: {chapter.title} → {section.title}")
             print(f"Using prompt: {args.prompt}")
             
-            # Determine if we should show original
-            show_original = args.show_original and not args.no_original
-            
-            # Create output filename
-            output_dir = config.output_dir
-            if args.output:
-                output_file = output_dir / args.output
-            else:
-                # Auto-generate filename
-                original_suffix = "_with_original" if show_original else "_only"
-                output_file = output_dir / f"ch{chapter_num}_sec{args.section}_{args.prompt}{original_suffix}.docx"
+            output_file = _build_output_path(config.output_dir, args, show_original, chapter_num, args.section)
             
             # Create exporter
             print(f"\nCreating document (show_original={show_original})...")
@@ -511,17 +890,7 @@ def main():
             print(f"Exporting entire chapter: {chapter.title}")
             print(f"Using prompt: {args.prompt}")
             
-            # Determine if we should show original
-            show_original = args.show_original and not args.no_original
-            
-            # Create output filename
-            output_dir = config.output_dir
-            if args.output:
-                output_file = output_dir / args.output
-            else:
-                # Auto-generate filename
-                original_suffix = "_with_original" if show_original else "_only"
-                output_file = output_dir / f"chapter{chapter_num}_{args.prompt}{original_suffix}.docx"
+            output_file = _build_output_path(config.output_dir, args, show_original, chapter_num)
             
             # Create exporter
             print(f"\nCreating document (show_original={show_original})...")
@@ -537,7 +906,7 @@ def main():
         print(f"  Prompt: {args.prompt}")
         print(f"  Show original: {show_original}")
         print("\nOpen the file in Word to review the translation!")
-        
+    
     finally:
         session.close()
 
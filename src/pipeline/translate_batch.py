@@ -9,7 +9,7 @@ import argparse
 from sqlalchemy import func
 
 from src.models import init_db, Chapter, Section, Paragraph, Translation
-from src.utils import config
+from src.utils import config, configure_logging
 from src.pipeline.step2_translate import TranslationService, translate_section_to_db
 
 
@@ -41,6 +41,7 @@ def main():
     )
     
     args = parser.parse_args()
+    configure_logging()
     
     # Determine the prompt name to use
     if args.model_suffix:
@@ -60,7 +61,7 @@ def main():
         print(f"Translation will be saved as prompt: '{prompt_name}'")
         
         # Initialize translation service
-        service = TranslationService(prompt_name=args.prompt)
+        service = TranslationService(prompt_name=args.prompt, cache_session=session)
         # Override the prompt_name for storage (to include model suffix)
         service.prompt_name = prompt_name
         
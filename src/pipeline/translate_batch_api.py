@@ -0,0 +1,436 @@
+"""
+Translate the book through the OpenAI Batch API.
+
+Instead of one blocking API call per section, every section that still needs
+translating is written as a request to a JSONL file and submitted as a single
+batch job. OpenAI processes the job asynchronously (within 24 hours) at half
+the price of regular requests; once it completes, the results are mapped back
+to their paragraphs and saved to the database.
+
+Usage:
+    python -m src.pipeline.translate_batch_api --prompt modern --model-suffix gpt5-mini
+    python -m src.pipeline.translate_batch_api --resume batch_abc123
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from src.models import init_db, query_in_chunks, Chapter, Section, Paragraph
+from src.utils import config, configure_logging
+from src.pipeline.step2_translate import TranslationService, save_translations
+from src.pipeline.translate_book import chunk_paragraphs, filter_untranslated
+
+# Batch statuses that mean the job is still running
+PENDING_STATUSES = ('validating', 'in_progress', 'finalizing', 'cancelling')
+
+
+def batches_dir() -> Path:
+    """Directory holding the request files and task maps of submitted batches."""
+    path = config.output_dir / 'batches'
+    path.mkdir(exist_ok=True)
+    return path
+
+
+def collect_tasks(
+    session: Session,
+    prompt_name: str,
+    start_chapter: int = 1,
+    end_chapter: int = None,
+    max_chunk_size: int = 20,
+    force_retranslate: bool = False
+) -> Dict[str, List[Paragraph]]:
+    """
+    Collect the paragraphs to translate, grouped into one request per section.
+    
+    Chapters without sections are a single request, and large sections are split
+    into chunks of max_chunk_size paragraphs, like translate_book does.
+    
+    Args:
+        session: Database session
+        prompt_name: Name translations are saved under
+        start_chapter: First chapter number to translate
+        end_chapter: Last chapter number to translate (None for all remaining)
+        max_chunk_size: Maximum paragraphs per request
+        force_retranslate: If True, include paragraphs that are already translated
+    
+    Returns:
+        Dict mapping each request's custom_id to its paragraphs
+    """
+    query = session.query(Chapter).filter(Chapter.chapter_number >= start_chapter)
+    if end_chapter is not None:
+        query = query.filter(Chapter.chapter_number <= end_chapter)
+    
+    # (custom_id prefix, paragraphs) for every section / sectionless chapter
+    groups = []
+    for chapter in query.order_by(Chapter.chapter_number):
+        sections = session.query(Section).filter(
+            Section.chapter_id == chapter.id
+        ).order_by(Section.section_number).all()
+        
+        if sections:
+            for section in sections:
+                paragraphs = session.query(Paragraph).filter(
+                    Paragraph.section_id == section.id
+                ).order_by(Paragraph.paragraph_number).all()
+                groups.append((f"section-{section.id}", paragraphs))
+        else:
+            paragraphs = session.query(Paragraph).filter(
+                Paragraph.chapter_id == chapter.id,
+                Paragraph.section_id == None
+            ).order_by(Paragraph.paragraph_number).all()
+            groups.append((f"chapter-{chapter.id}", paragraphs))
+    
+    tasks = {}
+    for prefix, paragraphs in groups:
+        if not force_retranslate:
+            paragraphs = filter_untranslated(session, paragraphs, prompt_name)
+        if not paragraphs:
+            continue
+        
+        chunks = chunk_paragraphs(paragraphs, max_chunk_size)
+        if len(chunks) == 1:
+            tasks[prefix] = chunks[0]
+        else:
+            for chunk_idx, chunk in enumerate(chunks, 1):
+                tasks[f"{prefix}-part{chunk_idx}"] = chunk
+    
+    return tasks
+
+
+def build_batch_jsonl(service: TranslationService, tasks: Dict[str, List[Paragraph]], path: Path) -> None:
+    """
+    Write one Batch API request line per task.
+    
+    Each request body is exactly what TranslationService.translate_section would send.
+    
+    Args:
+        service: TranslationService instance (provides the prompt and model)
+        tasks: Dict mapping custom_id to paragraphs (see collect_tasks)
+        path: JSONL file to write
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        for custom_id, paragraphs in tasks.items():
+            request = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": service.build_request(paragraphs),
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+def submit_batch(service: TranslationService, jsonl_path: Path):
+    """
+    Upload a request file and start a batch job for it.
+    
+    Returns:
+        The created Batch object
+    """
+    with open(jsonl_path, 'rb') as f:
+        input_file = service.client.files.create(file=f, purpose="batch")
+    
+    return service.client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+
+def wait_for_batch(service: TranslationService, batch_id: str, poll_interval: float = 60.0):
+    """
+    Poll a batch job until it is no longer running.
+    
+    Args:
+        service: TranslationService instance
+        batch_id: ID of the batch job
+        poll_interval: Seconds between status checks
+    
+    Returns:
+        The final Batch object (check its status for completed/failed/expired/cancelled)
+    """
+    while True:
+        batch = service.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts:
+            print(f"  Batch {batch_id}: {batch.status} ({counts.completed}/{counts.total} done, {counts.failed} failed)")
+        else:
+            print(f"  Batch {batch_id}: {batch.status}")
+        
+        if batch.status not in PENDING_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def download_batch_results(service: TranslationService, batch) -> Dict[str, str]:
+    """
+    Download the output of a completed batch.
+    
+    Failed requests are reported and left out of the result.
+    
+    Returns:
+        Dict mapping custom_id to the model's response text
+    """
+    results = {}
+    if not batch.output_file_id:
+        return results
+    
+    # Streamed line by line; the output of a whole-book batch runs to many megabytes
+    with service.client.files.with_streaming_response.content(batch.output_file_id) as output:
+        for line in output.iter_lines():
+            if not line.strip():
+                continue
+            
+            item = json.loads(line)
+            response = item.get('response') or {}
+            if item.get('error') or response.get('status_code') != 200:
+                print(f"  ✗ Request {item['custom_id']} failed: {item.get('error') or response.get('body')}")
+                continue
+            
+            results[item['custom_id']] = response['body']['choices'][0]['message']['content']
+    
+    return results
+
+
+def save_batch_results(
+    session: Session,
+    service: TranslationService,
+    tasks: Dict[str, List[Paragraph]],
+    results: Dict[str, str]
+) -> dict:
+    """
+    Parse each request's response and save all the translations in one transaction.
+    
+    A request whose response can't be parsed is reported and counted as errors;
+    the other requests' translations are still saved.
+    
+    Returns:
+        Dictionary with translated and error counts (in paragraphs)
+    """
+    error_count = 0
+    
+    all_paragraphs = []
+    all_translations = []
+    for custom_id, paragraphs in tasks.items():
+        translated_text = results.get(custom_id)
+        if not translated_text:
+            print(f"  ✗ No result for {custom_id}")
+            error_count += len(paragraphs)
+            continue
+        
+        try:
+            translations = service.parse_translations(translated_text, len(paragraphs))
+        except Exception as e:
+            print(f"  ✗ Error in {custom_id}: {e}")
+            error_count += len(paragraphs)
+            continue
+        
+        all_paragraphs.extend(paragraphs)
+        all_translations.extend(translations)
+    
+    try:
+        save_translations(session, all_paragraphs, all_translations, service.prompt_name, service.model)
+        service.cache_translations(all_paragraphs, all_translations)
+        session.commit()
+    except Exception as e:
+        print(f"  ✗ Error saving translations: {e}")
+        session.rollback()
+        return {'translated': 0, 'errors': error_count + len(all_paragraphs)}
+    
+    return {'translated': len(all_paragraphs), 'errors': error_count}
+
+
+def save_task_map(path: Path, service: TranslationService, prompt: str, tasks: Dict[str, List[Paragraph]]) -> None:
+    """
+    Record which paragraphs each request covers, so results can be saved by a later run.
+    
+    Args:
+        path: Task map file
+        service: Service the requests were built with (its prompt_name and model
+                 are what the translations are saved under)
+        prompt: Name of the config.yaml prompt the requests were built with
+        tasks: Dictionary mapping custom_id to paragraphs
+    """
+    task_map = {
+        'prompt_name': service.prompt_name,
+        'model': service.model,
+        # The response cache key depends on the prompt itself, not the name saved under
+        'prompt': prompt,
+        'cache_prompt_id': service._cache_prompt_id,
+        'tasks': {custom_id: [p.id for p in paragraphs] for custom_id, paragraphs in tasks.items()},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(task_map, f, indent=2)
+
+
+def load_task_map(session: Session, path: Path):
+    """
+    Load a task map written by save_task_map.
+    
+    Returns:
+        tuple: (task map dictionary, tasks dict mapping custom_id to paragraphs)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        task_map = json.load(f)
+    
+    all_ids = [pid for ids in task_map['tasks'].values() for pid in ids]
+    paragraphs = {p.id: p for p in query_in_chunks(session.query(Paragraph), Paragraph.id, all_ids)}
+    tasks = {
+        custom_id: [paragraphs[pid] for pid in ids]
+        for custom_id, ids in task_map['tasks'].items()
+    }
+    return task_map, tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Translate the book through the OpenAI Batch API'
+    )
+    parser.add_argument(
+        '--prompt',
+        type=str,
+        default='modern',
+        help='Prompt name from config.yaml (default: modern)'
+    )
+    parser.add_argument(
+        '--model-suffix',
+        type=str,
+        help='Suffix to add to prompt name for storage (e.g., "gpt5-mini")'
+    )
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=20,
+        help='Maximum paragraphs per request for large sections (default: 20)'
+    )
+    parser.add_argument(
+        '--force-retranslate',
+        action='store_true',
+        help='Re-translate paragraphs even if translation already exists'
+    )
+    parser.add_argument(
+        '--start-chapter',
+        type=int,
+        default=1,
+        help='Start from this chapter number (default: 1)'
+    )
+    parser.add_argument(
+        '--end-chapter',
+        type=int,
+        help='End at this chapter number (default: translate all remaining)'
+    )
+    parser.add_argument(
+        '--resume',
+        type=str,
+        metavar='BATCH_ID',
+        help='Wait for a previously submitted batch and save its results'
+    )
+    parser.add_argument(
+        '--no-wait',
+        action='store_true',
+        help='Submit the batch and exit (save the results later with --resume)'
+    )
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=60.0,
+        help='Seconds between batch status checks (default: 60)'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Write the request file without submitting it'
+    )
+    
+    args = parser.parse_args()
+    configure_logging()
+    
+    # Build the prompt name with optional suffix
+    if args.model_suffix:
+        prompt_name = f"{args.prompt}-{args.model_suffix}"
+    else:
+        prompt_name = args.prompt
+    
+    # Initialize database
+    engine, SessionLocal = init_db(config.database_url)
+    session = SessionLocal()
+    
+    try:
+        if args.resume:
+            batch_id = args.resume
+            task_map, tasks = load_task_map(session, batches_dir() / f"{batch_id}.json")
+            # The task map records which prompt the requests were built with. Maps
+            # written before it did can't be tied to a cache key, so their results
+            # are saved without being added to the response cache.
+            base_prompt = task_map.get('prompt')
+            service = TranslationService(
+                prompt_name=base_prompt or args.prompt,
+                cache_session=session if base_prompt else None
+            )
+            service.prompt_name = task_map['prompt_name']
+            service.model = task_map['model']
+            if base_prompt:
+                # As submitted, even if the prompt's text has changed since
+                service._cache_prompt_id = task_map['cache_prompt_id']
+        else:
+            service = TranslationService(prompt_name=args.prompt, cache_session=session)
+            # Override the prompt_name for storage (to include model suffix)
+            service.prompt_name = prompt_name
+            
+            print(f"Using OpenAI model: {service.model}")
+            print(f"Translation will be saved as prompt: '{prompt_name}'")
+            
+            tasks = collect_tasks(
+                session, prompt_name, args.start_chapter, args.end_chapter,
+                args.chunk_size, args.force_retranslate
+            )
+            if not tasks:
+                print("Nothing to translate")
+                return
+            
+            paragraph_count = sum(len(paragraphs) for paragraphs in tasks.values())
+            print(f"Prepared {len(tasks)} requests covering {paragraph_count} paragraphs")
+            
+            jsonl_path = batches_dir() / f"{prompt_name}-{int(time.time())}.jsonl"
+            build_batch_jsonl(service, tasks, jsonl_path)
+            print(f"Wrote requests to {jsonl_path}")
+            
+            if args.dry_run:
+                print("DRY RUN MODE - batch not submitted")
+                return
+            
+            batch_id = submit_batch(service, jsonl_path).id
+            save_task_map(batches_dir() / f"{batch_id}.json", service, args.prompt, tasks)
+            print(f"✓ Submitted batch {batch_id}")
+            
+            if args.no_wait:
+                print(f"\nTo save the results once the batch completes:")
+                print(f"  python -m src.pipeline.translate_batch_api --resume {batch_id}")
+                return
+        
+        batch = wait_for_batch(service, batch_id, args.poll_interval)
+        if batch.status != 'completed':
+            print(f"✗ Batch {batch_id} ended with status '{batch.status}'")
+        
+        results = download_batch_results(service, batch)
+        stats = save_batch_results(session, service, tasks, results)
+        
+        print("\n" + "=" * 80)
+        print("BATCH TRANSLATION SUMMARY")
+        print("=" * 80)
+        print(f"Batch: {batch_id}")
+        print(f"Model: {service.model}")
+        print(f"Prompt: {service.prompt_name}")
+        print(f"Translated: {stats['translated']}")
+        print(f"Errors: {stats['errors']}")
+    
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
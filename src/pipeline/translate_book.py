@@ -9,13 +9,15 @@ This script handles:
 """
 
 import argparse
-from typing import List
+import asyncio
+from collections import defaultdict
+from typing import List, Optional, Set, Tuple
 from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 
-from src.models import init_db, Chapter, Section, Paragraph, Translation
-from src.utils import config
-from src.pipeline.step2_translate import TranslationService
+from src.models import init_db, query_in_chunks, Chapter, Paragraph, Translation
+from src.utils import config, configure_logging
+from src.pipeline.step2_translate import TranslationService, save_translations
 
 
 def chunk_paragraphs(paragraphs: List[Paragraph], max_chunk_size: int = 20) -> List[List[Paragraph]]:
@@ -35,10 +37,20 @@ def chunk_paragraphs(paragraphs: List[Paragraph], max_chunk_size: int = 20) -> L
     return chunks
 
 
+def chapter_translated_ids(session: Session, chapter_id: int, prompt_name: str) -> Set[int]:
+    """IDs of a chapter's paragraphs that already have a translation for the prompt (one query)."""
+    rows = session.query(Translation.paragraph_id).join(Paragraph).filter(
+        Paragraph.chapter_id == chapter_id,
+        Translation.prompt_name == prompt_name
+    )
+    return {row[0] for row in rows}
+
+
 def filter_untranslated(
     session: Session,
     paragraphs: List[Paragraph],
-    prompt_name: str
+    prompt_name: str,
+    translated_ids: Optional[Set[int]] = None
 ) -> List[Paragraph]:
     """
     Filter out paragraphs that already have translations.
@@ -47,6 +59,8 @@ def filter_untranslated(
         session: Database session
         paragraphs: List of paragraphs to check
         prompt_name: Translation prompt name
+        translated_ids: IDs of translated paragraphs, if already known (e.g. from
+                        chapter_translated_ids); otherwise they are queried
         
     Returns:
         List of paragraphs without translations
@@ -54,25 +68,71 @@ def filter_untranslated(
     if not paragraphs:
         return []
     
-    # Get IDs of paragraphs that already have this translation
-    translated_ids = session.query(Translation.paragraph_id).filter(
-        Translation.paragraph_id.in_([p.id for p in paragraphs]),
-        Translation.prompt_name == prompt_name
-    ).all()
-    
-    translated_id_set = {tid[0] for tid in translated_ids}
+    if translated_ids is not None:
+        translated_id_set = translated_ids
+    else:
+        # Get IDs of paragraphs that already have this translation
+        translated_ids = query_in_chunks(
+            session.query(Translation.paragraph_id).filter(Translation.prompt_name == prompt_name),
+            Translation.paragraph_id,
+            [p.id for p in paragraphs]
+        )
+        
+        translated_id_set = {tid[0] for tid in translated_ids}
     
     # Return only untranslated paragraphs
     return [p for p in paragraphs if p.id not in translated_id_set]
 
 
+def _plan_chunks(
+    session: Session,
+    paragraphs: List[Paragraph],
+    prompt_name: str,
+    max_chunk_size: int,
+    force_retranslate: bool,
+    translated_ids: Optional[Set[int]] = None
+) -> Tuple[List[List[Paragraph]], int]:
+    """
+    Pick the paragraphs to translate and break them into chunks.
+    
+    translated_ids is passed on to filter_untranslated.
+    
+    Returns:
+        tuple: (chunks to translate, number of paragraphs skipped as already translated)
+    """
+    if not paragraphs:
+        return [], 0
+    
+    # Filter out already-translated paragraphs unless force_retranslate
+    skipped = 0
+    if not force_retranslate:
+        untranslated = filter_untranslated(session, paragraphs, prompt_name, translated_ids)
+        skipped = len(paragraphs) - len(untranslated)
+        
+        if skipped > 0:
+            print(f"  ℹ️  {skipped} paragraphs already translated (skipping)")
+        
+        paragraphs = untranslated
+        if not paragraphs:
+            return [], skipped
+    
+    # Check if we need to chunk
+    if len(paragraphs) > max_chunk_size:
+        chunks = chunk_paragraphs(paragraphs, max_chunk_size)
+        print(f"  📦 Breaking into {len(chunks)} chunks of ~{max_chunk_size} paragraphs each")
+    else:
+        chunks = [paragraphs]
+    return chunks, skipped
+
+
 def translate_paragraphs(
     session: Session,
     service: TranslationService,
     paragraphs: List[Paragraph],
     prompt_name: str,
     max_chunk_size: int = 20,
-    force_retranslate: bool = False
+    force_retranslate: bool = False,
+    translated_ids: Optional[Set[int]] = None
 ) -> dict:
     """
     Translate a list of paragraphs, chunking if necessary.
@@ -84,43 +144,22 @@ def translate_paragraphs(
         prompt_name: Name to save translations under
         max_chunk_size: Maximum paragraphs per chunk
         force_retranslate: If True, re-translate even if translation exists
+        translated_ids: IDs of already-translated paragraphs, if known
+                        (see filter_untranslated)
         
     Returns:
         Dictionary with success count and errors
     """
     total_paragraphs = len(paragraphs)
-    
-    if total_paragraphs == 0:
-        return {'total': 0, 'translated': 0, 'errors': 0, 'skipped': 0}
-    
-    # Filter out already-translated paragraphs unless force_retranslate
-    if not force_retranslate:
-        untranslated = filter_untranslated(session, paragraphs, prompt_name)
-        already_translated = total_paragraphs - len(untranslated)
-        
-        if already_translated > 0:
-            print(f"  ℹ️  {already_translated} paragraphs already translated (skipping)")
-        
-        if not untranslated:
-            return {
-                'total': total_paragraphs,
-                'translated': 0,
-                'errors': 0,
-                'skipped': already_translated
-            }
-        
-        paragraphs = untranslated
+    chunks, skipped = _plan_chunks(
+        session, paragraphs, prompt_name, max_chunk_size, force_retranslate, translated_ids
+    )
+    if not chunks:
+        return {'total': total_paragraphs, 'translated': 0, 'errors': 0, 'skipped': skipped}
     
     translated_count = 0
     error_count = 0
     
-    # Check if we need to chunk
-    if len(paragraphs) > max_chunk_size:
-        chunks = chunk_paragraphs(paragraphs, max_chunk_size)
-        print(f"  📦 Breaking into {len(chunks)} chunks of ~{max_chunk_size} paragraphs each")
-    else:
-        chunks = [paragraphs]
-    
     # Translate each chunk
     for chunk_idx, chunk in enumerate(chunks, 1):
         if len(chunks) > 1:
@@ -132,26 +171,7 @@ def translate_paragraphs(
             translations = service.translate_section(chunk)
             
             # Save to database
-            for para, trans_text in zip(chunk, translations):
-                # Check if translation already exists
-                existing = session.query(Translation).filter(
-                    Translation.paragraph_id == para.id,
-                    Translation.prompt_name == prompt_name
-                ).first()
-                
-                if existing:
-                    # Update existing
-                    existing.translated_text = trans_text
-                    existing.model = service.model
-                else:
-                    # Create new
-                    translation = Translation(
-                        paragraph_id=para.id,
-                        prompt_name=prompt_name,
-                        translated_text=trans_text,
-                        model=service.model
-                    )
-                    session.add(translation)
+            save_translations(session, chunk, translations, prompt_name, service.model)
             
             session.commit()
             translated_count += len(chunk)
@@ -162,8 +182,6 @@ def translate_paragraphs(
             error_count += len(chunk)
             session.rollback()
     
-    skipped = total_paragraphs - len(paragraphs) if not force_retranslate else 0
-    
     return {
         'total': total_paragraphs,
         'translated': translated_count,
@@ -172,6 +190,108 @@ def translate_paragraphs(
     }
 
 
+async def translate_paragraphs_async(
+    session: Session,
+    service: TranslationService,
+    paragraphs: List[Paragraph],
+    prompt_name: str,
+    max_chunk_size: int = 20,
+    force_retranslate: bool = False,
+    max_concurrent_requests: Optional[int] = None
+) -> dict:
+    """
+    Translate a list of paragraphs like translate_paragraphs, sending the chunks concurrently.
+    
+    See translate_chunks_async.
+    
+    Args:
+        session: Database session
+        service: TranslationService instance
+        paragraphs: List of paragraphs to translate
+        prompt_name: Name to save translations under
+        max_chunk_size: Maximum paragraphs per chunk
+        force_retranslate: If True, re-translate even if translation exists
+        max_concurrent_requests: Maximum requests in flight at once
+                                 (default: pipeline.max_concurrent_requests)
+        
+    Returns:
+        Dictionary with success count and errors
+    """
+    total_paragraphs = len(paragraphs)
+    chunks, skipped = _plan_chunks(session, paragraphs, prompt_name, max_chunk_size, force_retranslate)
+    if not chunks:
+        return {'total': total_paragraphs, 'translated': 0, 'errors': 0, 'skipped': skipped}
+    
+    stats = await translate_chunks_async(session, service, chunks, prompt_name, max_concurrent_requests)
+    return {'total': total_paragraphs, 'skipped': skipped, **stats}
+
+
+async def translate_chunks_async(
+    session: Session,
+    service: TranslationService,
+    chunks: List[List[Paragraph]],
+    prompt_name: str,
+    max_concurrent_requests: Optional[int] = None
+) -> dict:
+    """
+    Translate chunks of paragraphs concurrently, saving each one as it arrives.
+    
+    The chunks' requests overlap (up to max_concurrent_requests at a time, see
+    TranslationService.translate_all), and each chunk is saved and committed as
+    soon as its translations arrive; a chunk that fails is counted as errors
+    without stopping the others. The database work stays on this thread.
+    
+    The chunks may come from different sections and chapters (each chunk is
+    translated on its own, see _plan_chunks).
+    
+    Args:
+        session: Database session
+        service: TranslationService instance
+        chunks: Paragraph chunks to translate
+        prompt_name: Name to save translations under
+        max_concurrent_requests: Maximum requests in flight at once
+                                 (default: pipeline.max_concurrent_requests)
+        
+    Returns:
+        Dictionary with translated and error counts
+    """
+    translated_count = 0
+    error_count = 0
+    
+    def save_chunk(index, translations):
+        """Save a chunk's translations (called as each chunk finishes)."""
+        nonlocal translated_count, error_count
+        chunk_idx, chunk = index + 1, chunks[index]
+        if len(chunks) > 1:
+            print(f"\n  📦 Chunk {chunk_idx}/{len(chunks)}: {len(chunk)} paragraphs")
+        
+        if isinstance(translations, Exception):
+            print(f"    ✗ Error in chunk {chunk_idx}: {translations}")
+            error_count += len(chunk)
+            return
+        
+        try:
+            save_translations(session, chunk, translations, prompt_name, service.model)
+            session.commit()
+            translated_count += len(chunk)
+            print(f"    ✓ Saved {len(chunk)} translations")
+        except Exception as e:
+            print(f"    ✗ Error in chunk {chunk_idx}: {e}")
+            error_count += len(chunk)
+            session.rollback()
+    
+    print(f"    Calling OpenAI API...")
+    await service.translate_all(chunks, max_concurrent_requests, on_section_done=save_chunk)
+    
+    return {'translated': translated_count, 'errors': error_count}
+
+
+def _add_stats(overall_stats: dict, stats: dict):
+    """Add a translate call's counts to the running totals (stats must have every key)."""
+    for key in overall_stats:
+        overall_stats[key] += stats[key]
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Translate the entire book - all chapters and sections'
@@ -214,8 +334,19 @@ def main():
         action='store_true',
         help='Show what would be translated without actually translating'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        help='Maximum API requests in flight at once (default: from config; 1 sends the chunks one at a time)'
+    )
+    parser.add_argument(
+        '--qpm',
+        type=float,
+        help='Maximum API requests started per minute (default: from config)'
+    )
     
     args = parser.parse_args()
+    configure_logging()
     
     # Build the prompt name with optional suffix
     if args.model_suffix:
@@ -237,15 +368,15 @@ def main():
     session = SessionLocal()
     
     try:
-        # Get all chapters
-        all_chapters = session.query(Chapter).order_by(Chapter.chapter_number).all()
-        
-        # Filter by start/end chapter
-        chapters = [
-            c for c in all_chapters
-            if c.chapter_number >= args.start_chapter and
-               (args.end_chapter is None or c.chapter_number <= args.end_chapter)
-        ]
+        # Get the chapters in range, with their sections and paragraphs loaded
+        # up front (one query each) instead of a query per chapter and section
+        query = session.query(Chapter).filter(Chapter.chapter_number >= args.start_chapter)
+        if args.end_chapter is not None:
+            query = query.filter(Chapter.chapter_number <= args.end_chapter)
+        chapters = query.options(
+            selectinload(Chapter.sections),
+            selectinload(Chapter.paragraphs)
+        ).order_by(Chapter.chapter_number).all()
         
         if not chapters:
             print("No chapters found in the specified range")
@@ -255,7 +386,32 @@ def main():
         print("=" * 80)
         
         # Initialize service (not in dry-run)
-        service = None if args.dry_run else TranslationService(prompt_name=args.prompt)
+        service = None if args.dry_run else TranslationService(prompt_name=args.prompt, cache_session=session)
+        if service is not None and args.qpm is not None:
+            service.requests_per_minute = args.qpm
+        
+        # Chunks of every chapter in range, translated together after the loop
+        # when sending concurrently, so requests overlap across sections and chapters
+        pending_chunks = []
+        
+        def translate(paragraphs, translated_ids):
+            """Translate a section's (or chapter's) paragraphs with chunking, or queue their chunks."""
+            if args.concurrency == 1:
+                return translate_paragraphs(
+                    session, service, paragraphs, prompt_name,
+                    args.chunk_size, args.force_retranslate, translated_ids
+                )
+            chunks, skipped = _plan_chunks(
+                session, paragraphs, prompt_name, args.chunk_size, args.force_retranslate, translated_ids
+            )
+            pending_chunks.extend(chunks)
+            return {
+                'total': len(paragraphs),
+                'translated': 0,
+                'errors': 0,
+                'skipped': skipped,
+                'queued': sum(len(chunk) for chunk in chunks)
+            }
         
         # Track overall statistics
         overall_stats = {
@@ -271,10 +427,16 @@ def main():
             print(f"Chapter {chapter.chapter_number}: {chapter.title}")
             print("=" * 80)
             
+            # Split the chapter's paragraphs (ordered by number) by section
+            section_paragraphs = defaultdict(list)
+            for para in chapter.paragraphs:
+                section_paragraphs[para.section_id].append(para)
+            
+            # Which of the chapter's paragraphs are already translated, for all its sections
+            translated_ids = chapter_translated_ids(session, chapter.id, prompt_name)
+            
             # Check if chapter has sections
-            sections = session.query(Section).filter(
-                Section.chapter_id == chapter.id
-            ).order_by(Section.section_number).all()
+            sections = chapter.sections
             
             if sections:
                 # Chapter with sections
@@ -282,61 +444,60 @@ def main():
                 
                 for section in sections:
                     # Get paragraphs for this section
-                    paragraphs = session.query(Paragraph).filter(
-                        Paragraph.section_id == section.id
-                    ).order_by(Paragraph.paragraph_number).all()
+                    paragraphs = section_paragraphs[section.id]
                     
                     print(f"\nSection {section.section_number}: {section.title}")
                     print(f"  Paragraphs: {len(paragraphs)}")
                     
                     if args.dry_run:
-                        untranslated = filter_untranslated(session, paragraphs, prompt_name)
+                        untranslated = filter_untranslated(session, paragraphs, prompt_name, translated_ids)
                         print(f"  [DRY RUN] Would translate {len(untranslated)} paragraphs ({len(paragraphs) - len(untranslated)} already translated)")
                         overall_stats['total'] += len(paragraphs)
                         overall_stats['skipped'] += len(paragraphs) - len(untranslated)
                         continue
                     
                     # Translate with chunking
-                    stats = translate_paragraphs(
-                        session, service, paragraphs, prompt_name,
-                        args.chunk_size, args.force_retranslate
-                    )
+                    stats = translate(paragraphs, translated_ids)
                     
-                    overall_stats['total'] += stats['total']
-                    overall_stats['translated'] += stats['translated']
-                    overall_stats['errors'] += stats['errors']
-                    overall_stats['skipped'] += stats['skipped']
+                    _add_stats(overall_stats, stats)
                     
-                    print(f"  ✓ Section complete: {stats['translated']}/{stats['total']} translated, {stats['skipped']} skipped")
+                    if 'queued' in stats:
+                        print(f"  ⏳ Queued {stats['queued']}/{stats['total']} paragraphs, {stats['skipped']} skipped")
+                    else:
+                        print(f"  ✓ Section complete: {stats['translated']}/{stats['total']} translated, {stats['skipped']} skipped")
             
             else:
                 # Chapter without sections
-                paragraphs = session.query(Paragraph).filter(
-                    Paragraph.chapter_id == chapter.id,
-                    Paragraph.section_id == None
-                ).order_by(Paragraph.paragraph_number).all()
+                paragraphs = section_paragraphs[None]
                 
                 print(f"No sections - {len(paragraphs)} paragraphs directly\n")
                 
                 if args.dry_run:
-                    untranslated = filter_untranslated(session, paragraphs, prompt_name)
+                    untranslated = filter_untranslated(session, paragraphs, prompt_name, translated_ids)
                     print(f"[DRY RUN] Would translate {len(untranslated)} paragraphs ({len(paragraphs) - len(untranslated)} already translated)")
                     overall_stats['total'] += len(paragraphs)
                     overall_stats['skipped'] += len(paragraphs) - len(untranslated)
                     continue
                 
                 # Translate with chunking
-                stats = translate_paragraphs(
-                    session, service, paragraphs, prompt_name,
-                    args.chunk_size, args.force_retranslate
-                )
+                stats = translate(paragraphs, translated_ids)
                 
-                overall_stats['total'] += stats['total']
-                overall_stats['translated'] += stats['translated']
-                overall_stats['errors'] += stats['errors']
-                overall_stats['skipped'] += stats['skipped']
+                _add_stats(overall_stats, stats)
                 
-                print(f"✓ Chapter complete: {stats['translated']}/{stats['total']} translated, {stats['skipped']} skipped")
+                if 'queued' in stats:
+                    print(f"⏳ Queued {stats['queued']}/{stats['total']} paragraphs, {stats['skipped']} skipped")
+                else:
+                    print(f"✓ Chapter complete: {stats['translated']}/{stats['total']} translated, {stats['skipped']} skipped")
+        
+        if pending_chunks:
+            print(f"\n{'=' * 80}")
+            print(f"Translating {sum(len(chunk) for chunk in pending_chunks)} paragraphs in {len(pending_chunks)} chunks concurrently")
+            print("=" * 80)
+            stats = asyncio.run(translate_chunks_async(
+                session, service, pending_chunks, prompt_name, args.concurrency
+            ))
+            # The queued paragraphs were counted in total (and skipped) when queued
+            _add_stats(overall_stats, {'total': 0, 'skipped': 0, **stats})
         
         # Final summary
         print("\n" + "=" * 80)
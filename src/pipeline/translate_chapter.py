@@ -8,13 +8,14 @@ This script handles:
 """
 
 import argparse
-from typing import List
+import asyncio
+from typing import List, Optional
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from src.models import init_db, Chapter, Section, Paragraph, Translation
-from src.utils import config
-from src.pipeline.step2_translate import TranslationService
+from src.utils import config, configure_logging
+from src.pipeline.step2_translate import TranslationService, save_translations
 
 
 def chunk_paragraphs(paragraphs: List[Paragraph], max_chunk_size: int = 50) -> List[List[Paragraph]]:
@@ -90,26 +91,7 @@ def translate_paragraphs(
             translations = service.translate_section(chunk)
             
             # Save to database
-            for para, trans_text in zip(chunk, translations):
-                # Check if translation already exists
-                existing = session.query(Translation).filter(
-                    Translation.paragraph_id == para.id,
-                    Translation.prompt_name == prompt_name
-                ).first()
-                
-                if existing:
-                    # Update existing
-                    existing.translated_text = trans_text
-                    existing.model = service.model
-                else:
-                    # Create new
-                    translation = Translation(
-                        paragraph_id=para.id,
-                        prompt_name=prompt_name,
-                        translated_text=trans_text,
-                        model=service.model
-                    )
-                    session.add(translation)
+            save_translations(session, chunk, translations, prompt_name, service.model)
             
             session.commit()
             translated_count += len(chunk)
@@ -127,6 +109,99 @@ def translate_paragraphs(
     }
 
 
+async def translate_paragraphs_async(
+    session: Session,
+    service: TranslationService,
+    paragraphs: List[Paragraph],
+    prompt_name: str,
+    max_chunk_size: int = 50,
+    max_concurrent_requests: Optional[int] = None
+) -> dict:
+    """
+    Translate a list of paragraphs like translate_paragraphs, sending the chunks concurrently.
+    
+    Overwriting existing translations is confirmed for every chunk before any
+    request is sent; the accepted chunks are then translated up to
+    max_concurrent_requests at a time (see TranslationService.translate_all),
+    and each is saved and committed as soon as its translations arrive.
+    
+    Args:
+        session: Database session
+        service: TranslationService instance
+        paragraphs: List of paragraphs to translate
+        prompt_name: Name to save translations under
+        max_chunk_size: Maximum paragraphs per chunk
+        max_concurrent_requests: Maximum requests in flight at once
+                                 (default: pipeline.max_concurrent_requests)
+        
+    Returns:
+        Dictionary with success count and errors
+    """
+    total_paragraphs = len(paragraphs)
+    translated_count = 0
+    error_count = 0
+    
+    # Check if we need to chunk
+    if total_paragraphs > max_chunk_size:
+        chunks = chunk_paragraphs(paragraphs, max_chunk_size)
+        print(f"  Large section detected: {total_paragraphs} paragraphs")
+        print(f"  Breaking into {len(chunks)} chunks of ~{max_chunk_size} paragraphs each")
+    else:
+        chunks = [paragraphs]
+    
+    # Ask about existing translations up front, so the answers don't wait on the API
+    accepted = []
+    for chunk_idx, chunk in enumerate(chunks, 1):
+        existing_count = session.query(func.count(Translation.id)).join(Paragraph).filter(
+            Paragraph.id.in_([p.id for p in chunk]),
+            Translation.prompt_name == prompt_name
+        ).scalar()
+        
+        if existing_count > 0:
+            print(f"    ⚠️  Chunk {chunk_idx}/{len(chunks)}: {existing_count} paragraphs already translated")
+            response = input(f"    Re-translate and overwrite? (y/N): ").strip().lower()
+            if response != 'y':
+                print(f"    Skipping chunk {chunk_idx}")
+                continue
+        accepted.append((chunk_idx, chunk))
+    
+    if not accepted:
+        return {'total': total_paragraphs, 'translated': 0, 'errors': 0}
+    
+    def save_chunk(index, translations):
+        """Save a chunk's translations (called as each chunk finishes)."""
+        nonlocal translated_count, error_count
+        chunk_idx, chunk = accepted[index]
+        if len(chunks) > 1:
+            print(f"\n  📦 Chunk {chunk_idx}/{len(chunks)}: {len(chunk)} paragraphs")
+        
+        if isinstance(translations, Exception):
+            print(f"    ✗ Error in chunk {chunk_idx}: {translations}")
+            error_count += len(chunk)
+            return
+        
+        try:
+            save_translations(session, chunk, translations, prompt_name, service.model)
+            session.commit()
+            translated_count += len(chunk)
+            print(f"    ✓ Saved {len(chunk)} translations")
+        except Exception as e:
+            print(f"    ✗ Error in chunk {chunk_idx}: {e}")
+            error_count += len(chunk)
+            session.rollback()
+    
+    print(f"    Calling OpenAI API...")
+    await service.translate_all(
+        [chunk for _, chunk in accepted], max_concurrent_requests, on_section_done=save_chunk
+    )
+    
+    return {
+        'total': total_paragraphs,
+        'translated': translated_count,
+        'errors': error_count
+    }
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Translate an entire chapter (all sections or all paragraphs)'
@@ -159,8 +234,19 @@ def main():
         action='store_true',
         help='Show what would be translated without actually translating'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        help='Maximum API requests in flight at once (default: from config; 1 sends the chunks one at a time)'
+    )
+    parser.add_argument(
+        '--qpm',
+        type=float,
+        help='Maximum API requests started per minute (default: from config)'
+    )
     
     args = parser.parse_args()
+    configure_logging()
     
     # Build the prompt name with optional suffix
     if args.model_suffix:
@@ -190,6 +276,22 @@ def main():
         print(f"Chapter {args.chapter}: {chapter.title}")
         print("=" * 80)
         
+        # Initialize service once for all sections (not in dry-run), so its
+        # HTTP connections are reused
+        service = None if args.dry_run else TranslationService(prompt_name=args.prompt, cache_session=session)
+        if service is not None and args.qpm is not None:
+            service.requests_per_minute = args.qpm
+        
+        def translate(paragraphs):
+            """Translate a section's (or chapter's) paragraphs with chunking."""
+            if args.concurrency == 1:
+                return translate_paragraphs(
+                    session, service, paragraphs, prompt_name, args.chunk_size
+                )
+            return asyncio.run(translate_paragraphs_async(
+                session, service, paragraphs, prompt_name, args.chunk_size, args.concurrency
+            ))
+        
         # Check if chapter has sections
         sections = session.query(Section).filter(
             Section.chapter_id == chapter.id
@@ -215,13 +317,8 @@ def main():
                     total_stats['total'] += len(paragraphs)
                     continue
                 
-                # Create translation service
-                service = TranslationService(prompt_name=args.prompt)
-                
                 # Translate with chunking
-                stats = translate_paragraphs(
-                    session, service, paragraphs, prompt_name, args.chunk_size
-                )
+                stats = translate(paragraphs)
                 
                 total_stats['total'] += stats['total']
                 total_stats['translated'] += stats['translated']
@@ -242,13 +339,8 @@ def main():
                 print(f"[DRY RUN] Would translate {len(paragraphs)} paragraphs")
                 total_stats = {'total': len(paragraphs), 'translated': 0, 'errors': 0}
             else:
-                # Create translation service
-                service = TranslationService(prompt_name=args.prompt)
-                
                 # Translate with chunking
-                total_stats = translate_paragraphs(
-                    session, service, paragraphs, prompt_name, args.chunk_size
-                )
+                total_stats = translate(paragraphs)
         
         # Summary
         print("\n" + "=" * 80)
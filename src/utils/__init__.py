@@ -7,12 +7,20 @@ This module loads configuration from:
 3. Environment variables (override config.yaml)
 """
 
+import logging
 import os
+import sys
+from functools import cached_property
 from pathlib import Path
 from typing import Any, Dict, Optional
 import yaml
 from dotenv import load_dotenv
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _YamlLoader
+
 # Get the project root directory
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
@@ -41,7 +49,19 @@ class Config:
         # Load config.yaml
         if config_path.exists():
             with open(config_path, 'r', encoding='utf-8') as f:
-                self._config = yaml.safe_load(f) or {}
+                self._config = yaml.load(f, Loader=_YamlLoader) or {}
+        
+        # Every value (sections included) by its dotted key, so get() is a single lookup
+        self._flat: Dict[str, Any] = {}
+        self._flatten(self._config)
+    
+    def _flatten(self, section: Dict[str, Any], prefix: str = ''):
+        """Add a section's values to _flat, recursing into nested sections."""
+        for k, value in section.items():
+            key = f"{prefix}{k}"
+            self._flat[key] = value
+            if isinstance(value, dict):
+                self._flatten(value, f"{key}.")
     
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -58,16 +78,7 @@ class Config:
         Returns:
             Configuration value or default
         """
-        keys = key.split('.')
-        value = self._config
-        
-        for k in keys:
-            if isinstance(value, dict) and k in value:
-                value = value[k]
-            else:
-                return default
-        
-        return value
+        return self._flat.get(key, default)
     
     # Convenience properties for commonly used values
     
@@ -105,15 +116,15 @@ class Config:
         """Whether to echo SQL queries."""
         return self.get('database.echo', False)
     
-    @property
+    @cached_property
     def output_dir(self) -> Path:
-        """Get output directory path."""
+        """Get output directory path (created on first use)."""
         output_path = self.get('export.output_dir', 'output')
         output_dir = PROJECT_ROOT / output_path
         output_dir.mkdir(exist_ok=True)
         return output_dir
     
-    @property
+    @cached_property
     def assets_dir(self) -> Path:
         """Get assets directory path."""
         assets_dir = PROJECT_ROOT / 'assets'
@@ -152,6 +163,20 @@ class Config:
 config = Config()
 
 
+def configure_logging():
+    """
+    Send log messages to stdout, interleaved with the scripts' own output.
+    
+    The level comes from logging.level in config.yaml (default: INFO, which
+    shows per-request progress; DEBUG adds full responses).
+    """
+    logging.basicConfig(
+        level=config.get('logging.level', 'INFO'),
+        format='%(message)s',
+        stream=sys.stdout
+    )
+
+
 if __name__ == '__main__':
     # Test the configuration
     print("Configuration Test")
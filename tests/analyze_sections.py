@@ -2,6 +2,7 @@
 Analyze section lengths to help plan translation strategy.
 """
 
+from collections import defaultdict
 from sqlalchemy import func
 from src.models import init_db, Chapter, Section, Paragraph
 from src.utils import config
@@ -18,12 +19,33 @@ def main():
         print("Section Length Analysis")
         print("=" * 80)
         
-        # Get all chapters
-        chapters = session.query(Chapter).order_by(Chapter.chapter_number).all()
+        # Get all chapters (just the columns printed)
+        chapters = session.query(
+            Chapter.id, Chapter.chapter_number, Chapter.title
+        ).order_by(Chapter.chapter_number).all()
+        
+        # All sections, grouped by chapter, and all paragraph counts in one query each
+        sections_by_chapter = defaultdict(list)
+        for section in session.query(
+            Section.id, Section.chapter_id, Section.section_number, Section.title
+        ).order_by(Section.chapter_id, Section.section_number):
+            sections_by_chapter[section.chapter_id].append(section)
+        
+        section_counts = dict(
+            session.query(Paragraph.section_id, func.count(Paragraph.id))
+            .filter(Paragraph.section_id.isnot(None))
+            .group_by(Paragraph.section_id)
+        )
+        sectionless_counts = dict(
+            session.query(Paragraph.chapter_id, func.count(Paragraph.id))
+            .filter(Paragraph.section_id.is_(None))
+            .group_by(Paragraph.chapter_id)
+        )
         
         total_sections = 0
+        tiny_count = 0
         sections_by_size = {
-            'tiny': [],      # 1-10 paragraphs
+            'tiny': [],      # 1-10 paragraphs (only the first 5, which are printed)
             'small': [],     # 11-30 paragraphs
             'medium': [],    # 31-60 paragraphs
             'large': [],     # 61-100 paragraphs
@@ -35,15 +57,11 @@ def main():
             print("-" * 80)
             
             # Get sections for this chapter
-            sections = session.query(Section).filter(
-                Section.chapter_id == chapter.id
-            ).order_by(Section.section_number).all()
+            sections = sections_by_chapter[chapter.id]
             
             if sections:
                 for section in sections:
-                    para_count = session.query(func.count(Paragraph.id)).filter(
-                        Paragraph.section_id == section.id
-                    ).scalar()
+                    para_count = section_counts.get(section.id, 0)
                     
                     # Estimate tokens (rough: Hebrew word ~= 2 tokens, avg 10 words per paragraph)
                     estimated_tokens = para_count * 20
@@ -54,7 +72,9 @@ def main():
                     
                     # Categorize by size
                     if para_count <= 10:
-                        sections_by_size['tiny'].append((chapter.title, section.title, para_count))
+                        tiny_count += 1
+                        if tiny_count <= 5:
+                            sections_by_size['tiny'].append((chapter.title, section.title, para_count))
                     elif para_count <= 30:
                         sections_by_size['small'].append((chapter.title, section.title, para_count))
                     elif para_count <= 60:
@@ -67,10 +87,7 @@ def main():
                     total_sections += 1
             else:
                 # Chapter without sections
-                para_count = session.query(func.count(Paragraph.id)).filter(
-                    Paragraph.chapter_id == chapter.id,
-                    Paragraph.section_id == None
-                ).scalar()
+                para_count = sectionless_counts.get(chapter.id, 0)
                 estimated_tokens = para_count * 20
                 print(f"  No sections - {para_count} paragraphs directly")
                 print(f"  Estimated input tokens: ~{estimated_tokens:,}")
@@ -80,11 +97,11 @@ def main():
         print("Summary by Section Size")
         print("=" * 80)
         
-        print(f"\nTiny sections (1-10 paragraphs): {len(sections_by_size['tiny'])}")
-        for ch, sec, count in sections_by_size['tiny'][:5]:  # Show first 5
+        print(f"\nTiny sections (1-10 paragraphs): {tiny_count}")
+        for ch, sec, count in sections_by_size['tiny']:  # Show first 5
             print(f"  • {ch} → {sec}: {count} paragraphs")
-        if len(sections_by_size['tiny']) > 5:
-            print(f"  ... and {len(sections_by_size['tiny']) - 5} more")
+        if tiny_count > 5:
+            print(f"  ... and {tiny_count - 5} more")
         
         print(f"\nSmall sections (11-30 paragraphs): {len(sections_by_size['small'])}")
         for ch, sec, count in sections_by_size['small']:
@@ -106,7 +123,7 @@ def main():
         print("Recommendations:")
         print("=" * 80)
         print(f"• Total sections with text: {total_sections}")
-        print(f"• Sections under 50 paragraphs: {len(sections_by_size['tiny']) + len(sections_by_size['small']) + len(sections_by_size['medium'])}")
+        print(f"• Sections under 50 paragraphs: {tiny_count + len(sections_by_size['small']) + len(sections_by_size['medium'])}")
         print(f"• Sections over 100 paragraphs: {len(sections_by_size['huge'])}")
         print("\nStrategy:")
         print("  - Small/Medium sections (≤60): Translate as single unit")
@@ -14,7 +14,6 @@ def main():
     try:
         # Get the first translation (has a biblical quote)
         trans = session.query(Translation).first()
-        para = trans.paragraph
         
         print("=" * 80)
         print("Quote Preservation Check")
@@ -2,6 +2,8 @@
 Test script to verify HTML tags have been removed from paragraphs.
 """
 
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import joinedload
 from src.models import init_db, Paragraph
 from src.utils import config
 
@@ -13,26 +15,30 @@ def main():
     session = SessionLocal()
     
     try:
-        # Get first 10 paragraphs
-        paragraphs = session.query(Paragraph).limit(10).all()
+        # Of the first 10 paragraphs, fetch only those with a tag character
+        # (just the id and the start of the text that is printed)
+        first_ids = session.query(Paragraph.id).limit(10).subquery()
+        tagged = session.query(Paragraph.id, func.substr(Paragraph.text, 1, 100)).filter(
+            Paragraph.id.in_(select(first_ids.c.id)),
+            or_(Paragraph.text.like('%<%'), Paragraph.text.like('%>%'))
+        ).all()
         
         print("=" * 60)
         print("Testing for HTML tags in paragraphs")
         print("=" * 60)
         
-        html_tags_found = 0
+        html_tags_found = len(tagged)
         
-        for para in paragraphs:
-            if '<' in para.text or '>' in para.text:
-                html_tags_found += 1
-                print(f"\n⚠️  HTML tag found in paragraph {para.id}:")
-                print(f"   {para.text[:100]}...")
+        for para_id, snippet in tagged:
+            print(f"\n⚠️  HTML tag found in paragraph {para_id}:")
+            print(f"   {snippet}...")
         
         if html_tags_found == 0:
             print("\n✅ SUCCESS! No HTML tags found in the first 10 paragraphs.")
             print("\nSample clean paragraphs:")
             print("-" * 60)
-            for i, para in enumerate(paragraphs[:3], 1):
+            samples = session.query(Paragraph).options(joinedload(Paragraph.chapter)).limit(3).all()
+            for i, para in enumerate(samples, 1):
                 print(f"\n{i}. Paragraph {para.paragraph_number} from {para.chapter.title}:")
                 text = para.text[:150] if len(para.text) > 150 else para.text
                 print(f"   {text}...")
@@ -2,7 +2,9 @@
 Verification script to show what was imported into the database.
 """
 
+from collections import defaultdict
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from src.models import init_db, Chapter, Section, Paragraph
 from src.utils import config
 
@@ -14,50 +16,56 @@ def main():
     session = SessionLocal()
     
     try:
-        # Get counts
-        chapter_count = session.query(func.count(Chapter.id)).scalar()
-        section_count = session.query(func.count(Section.id)).scalar()
-        paragraph_count = session.query(func.count(Paragraph.id)).scalar()
+        # Chapters and sections (just the printed columns), with the sections
+        # grouped by chapter, and paragraph counts per (chapter, section) in one
+        # GROUP BY; every number in the report comes from these
+        chapters = session.query(
+            Chapter.id, Chapter.chapter_number, Chapter.title
+        ).order_by(Chapter.chapter_number).all()
+        sections = session.query(
+            Section.id, Section.chapter_id, Section.section_number, Section.title
+        ).order_by(Section.chapter_id, Section.section_number).all()
+        sections_by_chapter = defaultdict(list)
+        for section in sections:
+            sections_by_chapter[section.chapter_id].append(section)
+        
+        para_by_chapter = defaultdict(int)
+        para_by_section = {}
+        for chapter_id, section_id, count in session.query(
+            Paragraph.chapter_id, Paragraph.section_id, func.count(Paragraph.id)
+        ).group_by(Paragraph.chapter_id, Paragraph.section_id):
+            para_by_chapter[chapter_id] += count
+            para_by_section[section_id] = count
         
         print("=" * 60)
         print("Database Import Verification")
         print("=" * 60)
-        print(f"Total Chapters: {chapter_count}")
-        print(f"Total Sections: {section_count}")
-        print(f"Total Paragraphs: {paragraph_count}")
+        print(f"Total Chapters: {len(chapters)}")
+        print(f"Total Sections: {len(sections)}")
+        print(f"Total Paragraphs: {sum(para_by_chapter.values())}")
         print()
         
         # Show all chapters
         print("Chapters:")
         print("-" * 60)
-        chapters = session.query(Chapter).order_by(Chapter.chapter_number).all()
         for chapter in chapters:
-            para_count = session.query(func.count(Paragraph.id)).filter(
-                Paragraph.chapter_id == chapter.id
-            ).scalar()
-            section_count_ch = session.query(func.count(Section.id)).filter(
-                Section.chapter_id == chapter.id
-            ).scalar()
+            para_count = para_by_chapter.get(chapter.id, 0)
+            sections = sections_by_chapter[chapter.id]
+            section_count_ch = len(sections)
             
             print(f"{chapter.chapter_number}. {chapter.title}")
             print(f"   Sections: {section_count_ch}, Paragraphs: {para_count}")
             
             # Show sections for this chapter
-            sections = session.query(Section).filter(
-                Section.chapter_id == chapter.id
-            ).order_by(Section.section_number).all()
-            
             for section in sections:
-                section_para_count = session.query(func.count(Paragraph.id)).filter(
-                    Paragraph.section_id == section.id
-                ).scalar()
+                section_para_count = para_by_section.get(section.id, 0)
                 print(f"     {section.section_number}. {section.title} ({section_para_count} paragraphs)")
         
         print()
         print("=" * 60)
         print("Sample paragraph (first paragraph):")
         print("-" * 60)
-        first_para = session.query(Paragraph).first()
+        first_para = session.query(Paragraph).options(joinedload(Paragraph.chapter)).first()
         if first_para:
             print(f"Chapter: {first_para.chapter.title}")
             print(f"Paragraph {first_para.paragraph_number}:")
@@ -3,6 +3,7 @@ Verify and review translations in the database.
 """
 
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from src.models import init_db, Chapter, Section, Paragraph, Translation
 from src.utils import config
 
@@ -33,11 +34,10 @@ def main():
         print("\nTranslations by prompt:")
         print("-" * 80)
         
-        prompts = session.query(Translation.prompt_name).distinct().all()
-        for (prompt_name,) in prompts:
-            count = session.query(func.count(Translation.id)).filter(
-                Translation.prompt_name == prompt_name
-            ).scalar()
+        prompt_counts = session.query(
+            Translation.prompt_name, func.count(Translation.id)
+        ).group_by(Translation.prompt_name).all()
+        for prompt_name, count in prompt_counts:
             print(f"  {prompt_name}: {count} paragraphs")
         
         # Show sample translations
@@ -45,7 +45,12 @@ def main():
         print("Sample Translations")
         print("=" * 80)
         
-        translations = session.query(Translation).limit(5).all()
+        # Each translation's paragraph, chapter and section come in the same query
+        with_context = (
+            joinedload(Translation.paragraph).joinedload(Paragraph.chapter),
+            joinedload(Translation.paragraph).joinedload(Paragraph.section),
+        )
+        translations = session.query(Translation).options(*with_context).limit(5).all()
         
         for i, trans in enumerate(translations, 1):
             para = trans.paragraph
@@ -72,7 +77,7 @@ def main():
             print("Full Example - First Translation")
             print("=" * 80)
             
-            first = session.query(Translation).first()
+            first = session.query(Translation).options(*with_context).first()
             para = first.paragraph
             
             print(f"\nChapter: {para.chapter.title}")